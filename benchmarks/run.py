@@ -0,0 +1,109 @@
+"""Baseline numbers against the local MockServer, no MetaTrader needed
+
+    python benchmarks/run.py
+    python benchmarks/run.py --days 30 --commands 2000 --seconds 5
+
+Measures history throughput in rows/s for JSON and binary payloads, decoded
+on threads or with --processes on a process pool, command round trip latency
+and the live tick rate a stream can consume.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ejtraderMT import Metatrader  # noqa: E402
+from ejtraderMT.api.mock import MockServer  # noqa: E402
+
+
+def history(days, chartTF, encoding, processes=None):
+    api = Metatrader(encoding=encoding, processes=processes)
+    end = datetime(2021, 1, 1)
+    begin = end - timedelta(days=days)
+    start = time.perf_counter()
+    df = api.history(
+        "EURUSD", chartTF, begin.strftime("%d/%m/%Y"), end.strftime("%d/%m/%Y")
+    )
+    elapsed = time.perf_counter() - start
+    rows = 0 if df is None else len(df)
+    return {
+        "benchmark": f"history {chartTF} {encoding}"
+        + (f" x{processes}" if processes else ""),
+        "count": rows,
+        "seconds": elapsed,
+        "rate": f"{rows / elapsed:,.0f} rows/s",
+    }
+
+
+def commands(count, action):
+    api = Metatrader()
+    api.metrics.reset()
+    start = time.perf_counter()
+    for _ in range(count):
+        api.balance() if action == "BALANCE" else api.positions()
+    elapsed = time.perf_counter() - start
+    p50 = api.metrics.percentile(action, q=0.5) * 1e3
+    p99 = api.metrics.percentile(action, q=0.99) * 1e3
+    return {
+        "benchmark": f"command {action}",
+        "count": count,
+        "seconds": elapsed,
+        "rate": f"{count / elapsed:,.0f} req/s p50 {p50:.3f} ms p99 {p99:.3f} ms",
+    }
+
+
+def streaming(seconds, symbols):
+    api = Metatrader()
+    stream = api.stream(symbols, "TICK")
+    # let the subscription reach the publisher before counting
+    stream.get(timeout=5)
+    stream.drain()
+    received = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        received += len(stream.drain(timeout=0.1))
+    elapsed = time.perf_counter() - start
+    stream.close()
+    return {
+        "benchmark": f"stream TICK x{len(symbols)}",
+        "count": received,
+        "seconds": elapsed,
+        "rate": f"{received / elapsed:,.0f} ticks/s dropped {stream.dropped}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=365, help="days of M1 history")
+    parser.add_argument("--commands", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=3.0, help="streaming time")
+    parser.add_argument("--symbols", default="EURUSD,GBPUSD,USDJPY,AUDUSD")
+    parser.add_argument(
+        "--processes", type=int, default=0, help="also decode history on processes"
+    )
+    args = parser.parse_args()
+
+    results = []
+    with MockServer(stream_interval=0):
+        for encoding in ("json", "binary"):
+            results.append(history(args.days, "M1", encoding))
+            if args.processes:
+                results.append(history(args.days, "M1", encoding, args.processes))
+        results.append(commands(args.commands, "BALANCE"))
+        results.append(commands(args.commands, "POSITIONS"))
+        results.append(streaming(args.seconds, args.symbols.split(",")))
+
+    print()
+    for result in results:
+        print(
+            f"{result['benchmark']:<24} {result['count']:>12,} "
+            f"{result['seconds']:>8.2f} s  {result['rate']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
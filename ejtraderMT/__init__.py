@@ -1 +1,2 @@
-from .api.mql import Metatrader #noqa
\ No newline at end of file
+from .api.mql import Metatrader #noqa
+from .api.aio import AsyncMetatrader #noqa
\ No newline at end of file
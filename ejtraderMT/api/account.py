@@ -0,0 +1,204 @@
+from threading import Event, Lock, Thread
+import logging
+
+
+class Book:
+    """Positions or orders indexed by id and by symbol"""
+
+    def __init__(self):
+        self.by_id = {}
+        self.by_symbol = {}
+
+    def add(self, item):
+        self.remove(item["id"])
+        self.by_id[item["id"]] = item
+        self.by_symbol.setdefault(item.get("symbol"), {})[item["id"]] = item
+
+    def remove(self, id):
+        item = self.by_id.pop(id, None)
+        if item is not None:
+            same = self.by_symbol.get(item.get("symbol"), {})
+            same.pop(id, None)
+            if not same:
+                self.by_symbol.pop(item.get("symbol"), None)
+        return item
+
+    def replace(self, items):
+        self.by_id = {}
+        self.by_symbol = {}
+        for item in items:
+            self.add(item)
+
+
+class AccountMirror:
+    """Positions, orders and account kept in process from the event stream
+
+    Seeded from POSITIONS, ORDERS and ACCOUNT, then every trade event is
+    applied locally and a reconciliation with the terminal follows `settle`
+    seconds later, and anyway every `reconcile` seconds. Reads never leave the
+    process. `command` sends one command and returns its reply, it is called
+    from the reconciliation thread.
+    """
+
+    def __init__(self, command, reconcile=60, settle=1.0):
+        self.command = command
+        self.reconcile = reconcile
+        self.settle = settle
+        self.account = {}
+        self.synced = 0
+        self.__positions = Book()
+        self.__orders = Book()
+        self.__lock = Lock()
+        self.__dirty = Event()
+        self.__stop = Event()
+        self.__thread = None
+
+    def start(self):
+        self.sync()
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        return self
+
+    def close(self):
+        self.__stop.set()
+        self.__dirty.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def sync(self):
+        """Replace the local state with the terminal's"""
+        positions = self.command(action="POSITIONS")
+        orders = self.command(action="ORDERS")
+        account = self.command(action="ACCOUNT")
+        with self.__lock:
+            if isinstance(positions, dict) and "positions" in positions:
+                self.__positions.replace(positions["positions"])
+            if isinstance(orders, dict) and "orders" in orders:
+                self.__orders.replace(orders["orders"])
+            if isinstance(account, dict) and not account.get("error"):
+                self.account = account
+            self.synced += 1
+
+    def __run(self):
+        while not self.__stop.is_set():
+            if self.__dirty.wait(self.reconcile):
+                # let a burst of trades finish before asking the terminal
+                self.__stop.wait(self.settle)
+            if self.__stop.is_set():
+                return
+            self.__dirty.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                logging.info(
+                    f"Error while reconciling account. Error message: {str(e)}"
+                )
+
+    # retcodes of requests that changed the book, placed, done, partially done
+    DONE = (10008, 10009, 10010)
+
+    def apply(self, event):
+        """Update the state from one trade event
+
+        The event is the MqlTradeRequest of a TRADE_TRANSACTION_REQUEST with
+        its MqlTradeResult under "result", as the EA publishes them.
+        """
+        if not isinstance(event, dict):
+            return
+        result = event.get("result") or {}
+        if result.get("retcode") not in self.DONE:
+            return
+        action = event.get("action")
+        with self.__lock:
+            if action == "TRADE_ACTION_DEAL":
+                if event.get("position"):
+                    self.__reduce(event.get("position"), result.get("volume"))
+                elif result.get("order"):
+                    self.__positions.add(self.__entry(event, result))
+            elif action == "TRADE_ACTION_PENDING":
+                if result.get("order"):
+                    self.__orders.add(self.__entry(event, result))
+            elif action == "TRADE_ACTION_SLTP":
+                position = self.__positions.by_id.get(event.get("position"))
+                if position is not None:
+                    position["stoploss"] = event.get("sl")
+                    position["takeprofit"] = event.get("tp")
+            elif action == "TRADE_ACTION_MODIFY":
+                order = self.__orders.by_id.get(event.get("order"))
+                if order is not None:
+                    order["stoploss"] = event.get("sl")
+                    order["takeprofit"] = event.get("tp")
+                    order["open"] = event.get("price") or order.get("open")
+            elif action == "TRADE_ACTION_REMOVE":
+                self.__orders.remove(event.get("order"))
+            elif action == "TRADE_ACTION_CLOSE_BY":
+                # volumes of the two sides are settled by the reconciliation
+                self.__positions.remove(event.get("position"))
+                self.__positions.remove(event.get("position_by"))
+        # the terminal has the last word on fills, prices and tickets
+        self.__dirty.set()
+
+    def __reduce(self, id, volume):
+        position = self.__positions.by_id.get(id)
+        if position is None:
+            return
+        volume = round((position["volume"] or 0) - (volume or 0), 8)
+        if volume > 0:
+            position["volume"] = volume
+        else:
+            self.__positions.remove(id)
+
+    def current(self):
+        """Reconcile now when trades happened since the last sync
+
+        Used before acting on every ticket of the book, so no trade event
+        still on its way is missed.
+        """
+        if self.__dirty.is_set():
+            self.__dirty.clear()
+            self.sync()
+        return self
+
+    @staticmethod
+    def __entry(event, result):
+        return {
+            "id": result["order"],
+            "magic": event.get("magic"),
+            "symbol": event.get("symbol"),
+            "type": event.get("type"),
+            "open": result.get("price") or event.get("price"),
+            "stoploss": event.get("sl"),
+            "takeprofit": event.get("tp"),
+            "volume": result.get("volume") or event.get("volume"),
+        }
+
+    def position(self, id):
+        return self.__positions.by_id.get(id)
+
+    def order(self, id):
+        return self.__orders.by_id.get(id)
+
+    def positions(self, symbol=None):
+        """Open positions, of one symbol when given"""
+        with self.__lock:
+            if symbol is None:
+                return list(self.__positions.by_id.values())
+            return list(self.__positions.by_symbol.get(symbol, {}).values())
+
+    def orders(self, symbol=None):
+        """Pending orders, of one symbol when given"""
+        with self.__lock:
+            if symbol is None:
+                return list(self.__orders.by_id.values())
+            return list(self.__orders.by_symbol.get(symbol, {}).values())
+
+    def volume(self, symbol):
+        """Total open volume of a symbol"""
+        with self.__lock:
+            return round(
+                sum(
+                    p.get("volume") or 0
+                    for p in self.__positions.by_symbol.get(symbol, {}).values()
+                ),
+                8,
+            )
@@ -0,0 +1,426 @@
+from datetime import datetime, timedelta
+import asyncio
+import itertools
+import json
+import logging
+import time
+
+import zmq
+import zmq.asyncio
+
+from .history import AdaptiveChunker, IncompleteHistory
+from .decoder import HistoryDecoder, align
+from .mql import Functions, LOGGER
+from .pool import SYS_PORT, parse_endpoints
+from .metrics import Metrics
+from .retry import RetryPolicy
+from .clock import BrokerClock
+from .wire import decode_reply
+
+
+class AsyncFunctions:
+    """Asyncio command channel, one DEALER socket with request-id correlation"""
+
+    def __init__(
+        self,
+        host=None,
+        timeout=1000,
+        max_inflight=8,
+        context=None,
+        encoding=None,
+        metrics=None,
+        retry=None,
+        port=None,
+    ):
+        self.HOST = host or "localhost"
+        self.SYS_PORT = port or SYS_PORT  # REP/REQ port
+        self.timeout = timeout / 1000
+        self.encoding = encoding or "json"
+        # Metrics collecting command timings, None disables them
+        self.metrics = metrics
+        # resend policy for commands that timed out
+        self.retry = retry or RetryPolicy()
+
+        context = context or zmq.asyncio.Context.instance()
+        try:
+            self.sys_socket = context.socket(zmq.DEALER)
+            self.sys_socket.LINGER = 0
+            self.sys_socket.connect("tcp://{}:{}".format(self.HOST, self.SYS_PORT))
+        except zmq.ZMQError:
+            raise zmq.ZMQBindError("Binding ports ERROR")
+
+        self.__ids = itertools.count()
+        self.__pending = {}
+        self.__reader = None
+        self.__inflight = asyncio.Semaphore(max_inflight)
+
+    async def _reader(self):
+        """Resolve pending requests with the replies routed back by REP"""
+        while True:
+            frames = await self.sys_socket.recv_multipart()
+            future, request = self.__pending.pop(frames[0], (None, None))
+            if future is None or future.done():
+                # reply for a request that already timed out
+                continue
+            try:
+                start = time.perf_counter()
+                reply = decode_reply(frames[frames.index(b"") + 1 :])
+                if self.metrics is not None:
+                    self.metrics.observe(
+                        request["action"],
+                        request["actionType"],
+                        "decode",
+                        time.perf_counter() - start,
+                    )
+                    if isinstance(reply, dict) and reply.get("error"):
+                        self.metrics.count(
+                            request["action"], request["actionType"], "errors"
+                        )
+                future.set_result(reply)
+            except ValueError as err:
+                future.set_exception(zmq.NotDone(err))
+
+    async def Command(self, **kwargs) -> dict:
+        """Construct a request dictionary from default, send it and await the reply"""
+        request = Functions._request(**kwargs)
+        if self.encoding == "binary" and request["action"] == "HISTORY":
+            request["encoding"] = "binary"
+        if self.__reader is None or self.__reader.done():
+            self.__reader = asyncio.ensure_future(self._reader())
+
+        for attempt in range(self.retry.attempts):
+            if attempt:
+                await asyncio.sleep(self.retry.delay(attempt))
+                logging.info(f"Retrying {request['action']} after a timeout")
+                self.__count(request, "retries")
+            try:
+                return await self.__roundtrip(request)
+            except zmq.NotDone:
+                # DEALER sockets never get stuck, a late reply is just dropped
+                last = attempt + 1 == self.retry.attempts
+                if last or not self.retry.retryable(request):
+                    raise
+
+    async def __roundtrip(self, request):
+        # REP echoes every frame before the empty delimiter, the id frame
+        # comes back with the reply and pairs it with its request
+        request_id = str(next(self.__ids)).encode()
+        future = asyncio.get_running_loop().create_future()
+        async with self.__inflight:
+            self.__pending[request_id] = (future, request)
+            start = time.perf_counter()
+            try:
+                await self.sys_socket.send_multipart(
+                    [request_id, b"", json.dumps(request).encode()]
+                )
+            except zmq.ZMQError:
+                self.__pending.pop(request_id, None)
+                self.__count(request, "timeouts")
+                raise zmq.NotDone("Sending request ERROR")
+            sent = time.perf_counter()
+            # REP serves one request at a time, the ones sent before this
+            # reply first and each of them gets its own timeout
+            depth = len(self.__pending)
+            try:
+                reply = await asyncio.wait_for(future, self.timeout * depth)
+            except asyncio.TimeoutError:
+                self.__pending.pop(request_id, None)
+                self.__count(request, "timeouts")
+                raise zmq.NotDone("Data socket timeout ERROR")
+            if self.metrics is not None:
+                done = time.perf_counter()
+                # wait includes the decode done by the reader
+                action, actionType = request["action"], request["actionType"]
+                self.metrics.observe(action, actionType, "send", sent - start)
+                self.metrics.observe(action, actionType, "wait", done - sent)
+                self.metrics.observe(action, actionType, "total", done - start)
+            return reply
+
+    def __count(self, request, name):
+        if self.metrics is not None:
+            self.metrics.count(request["action"], request["actionType"], name)
+
+    def close(self):
+        if self.__reader is not None:
+            self.__reader.cancel()
+        self.sys_socket.close()
+
+
+class AsyncMetatrader:
+    """Awaitable subset of Metatrader, requests can be pipelined from one loop"""
+
+    def __init__(
+        self,
+        host=None,
+        real_volume=None,
+        timeout=1000,
+        max_inflight=8,
+        debug=False,
+        encoding=None,
+        retry=None,
+    ):
+        if debug:
+            logging.basicConfig(**LOGGER)
+
+        # timings of every command, see metrics.summary() and metrics.prometheus()
+        self.metrics = Metrics()
+        # "host" or "host:port" like Metatrader, commands go to the first terminal
+        host, port = parse_endpoints(host)[0]
+        self.__api = AsyncFunctions(
+            host,
+            port=port,
+            timeout=timeout,
+            max_inflight=max_inflight,
+            encoding=encoding,
+            metrics=self.metrics,
+            retry=retry,
+        )
+        self.real_volume = real_volume or False
+        # broker time served locally, measured on first use and refreshed
+        self.clock = BrokerClock()
+
+    async def balance(self):
+        return await self.__api.Command(action="BALANCE")
+
+    async def accountInfo(self):
+        return await self.__api.Command(action="ACCOUNT")
+
+    async def positions(self):
+        return await self.__api.Command(action="POSITIONS")
+
+    async def orders(self):
+        return await self.__api.Command(action="ORDERS")
+
+    async def trade(
+        self, symbol, actionType, volume, stoploss, takeprofit, price, deviation
+    ):
+        return await self.__api.Command(
+            action="TRADE",
+            actionType=actionType,
+            symbol=symbol,
+            volume=volume,
+            stoploss=stoploss,
+            takeprofit=takeprofit,
+            price=price,
+            deviation=deviation,
+        )
+
+    async def buy(self, symbol, volume, stoploss, takeprofit, deviation=5):
+        return await self.trade(
+            symbol, "ORDER_TYPE_BUY", volume, stoploss, takeprofit, 0, deviation
+        )
+
+    async def sell(self, symbol, volume, stoploss, takeprofit, deviation=5):
+        return await self.trade(
+            symbol, "ORDER_TYPE_SELL", volume, stoploss, takeprofit, 0, deviation
+        )
+
+    async def buyLimit(
+        self, symbol, volume, stoploss, takeprofit, price=0, deviation=5
+    ):
+        return await self.trade(
+            symbol,
+            "ORDER_TYPE_BUY_LIMIT",
+            volume,
+            stoploss,
+            takeprofit,
+            price,
+            deviation,
+        )
+
+    async def sellLimit(
+        self, symbol, volume, stoploss, takeprofit, price=0, deviation=5
+    ):
+        return await self.trade(
+            symbol,
+            "ORDER_TYPE_SELL_LIMIT",
+            volume,
+            stoploss,
+            takeprofit,
+            price,
+            deviation,
+        )
+
+    async def buyStop(self, symbol, volume, stoploss, takeprofit, price=0, deviation=5):
+        return await self.trade(
+            symbol,
+            "ORDER_TYPE_BUY_STOP",
+            volume,
+            stoploss,
+            takeprofit,
+            price,
+            deviation,
+        )
+
+    async def sellStop(
+        self, symbol, volume, stoploss, takeprofit, price=0, deviation=5
+    ):
+        return await self.trade(
+            symbol,
+            "ORDER_TYPE_SELL_STOP",
+            volume,
+            stoploss,
+            takeprofit,
+            price,
+            deviation,
+        )
+
+    async def positionModify(self, id, stoploss, takeprofit):
+        return await self.__api.Command(
+            action="TRADE",
+            actionType="POSITION_MODIFY",
+            id=id,
+            stoploss=stoploss,
+            takeprofit=takeprofit,
+        )
+
+    async def orderModify(self, id, stoploss, takeprofit, price):
+        return await self.__api.Command(
+            action="TRADE",
+            actionType="ORDER_MODIFY",
+            id=id,
+            stoploss=stoploss,
+            takeprofit=takeprofit,
+            price=price,
+        )
+
+    async def ClosePartial(self, id, volume):
+        return await self.__api.Command(
+            action="TRADE", actionType="POSITION_PARTIAL", id=id, volume=volume
+        )
+
+    async def CloseById(self, id):
+        return await self.__api.Command(
+            action="TRADE", actionType="POSITION_CLOSE_ID", id=id
+        )
+
+    async def CloseBySymbol(self, symbol):
+        return await self.__api.Command(
+            action="TRADE", actionType="POSITION_CLOSE_SYMBOL", symbol=symbol
+        )
+
+    async def CancelById(self, id):
+        return await self.__api.Command(
+            action="TRADE", actionType="ORDER_CANCEL", id=id
+        )
+
+    async def batch(self, actions):
+        """Send a list of trade actions concurrently, one reply per action
+
+        Each action is a dict of Command arguments, action defaults to TRADE.
+        A failed action comes back as {"error": True, "description": ...}.
+        """
+        replies = await asyncio.gather(
+            *(self.__api.Command(**dict({"action": "TRADE"}, **a)) for a in actions),
+            return_exceptions=True,
+        )
+        return [
+            {"error": True, "description": str(r)} if isinstance(r, Exception) else r
+            for r in replies
+        ]
+
+    async def cancel_all(self):
+        orders = await self.orders()
+        if "orders" in orders:
+            return await self.batch(
+                [
+                    {"actionType": "ORDER_CANCEL", "id": order["id"]}
+                    for order in orders["orders"]
+                ]
+            )
+
+    async def close_all(self):
+        positions = await self.positions()
+        if "positions" in positions:
+            return await self.batch(
+                [
+                    {"actionType": "POSITION_CLOSE_ID", "id": position["id"]}
+                    for position in positions["positions"]
+                ]
+            )
+
+    async def history(
+        self, symbol, chartTF, fromDate, toDate=None, how="inner", rows=5000
+    ):
+        actives = symbol if isinstance(symbol, list) else [symbol]
+        if not isinstance(fromDate, int):
+            start_date = datetime.strptime(fromDate, "%d/%m/%Y")
+        else:
+            start_date = await self.__brokerTimeDelta(fromDate)
+        if not toDate:
+            end_date = await self.__brokerTimeDelta(0)
+        else:
+            end_date = datetime.strptime(toDate, "%d/%m/%Y")
+
+        # requests are sent together, windows keep the first size of the chunker
+        chunker = AdaptiveChunker(
+            self.__date_to_timestamp(start_date),
+            self.__date_to_timestamp(end_date + timedelta(days=1)),
+            chartTF,
+            rows=rows,
+            first=rows,
+        )
+        windows = list(iter(chunker.next, None))
+        requests = [
+            dict(
+                action="HISTORY",
+                actionType="DATA",
+                symbol=active,
+                chartTF=chartTF,
+                fromDate=begin,
+                toDate=end,
+            )
+            for active in actives
+            for begin, end in windows
+        ]
+        replies = await asyncio.gather(
+            *(self.__api.Command(**request) for request in requests),
+            return_exceptions=True,
+        )
+        failed = []
+        for request, reply in zip(requests, replies):
+            if isinstance(reply, Exception):
+                logging.info(
+                    f"Error while processing {request['symbol']} from "
+                    f"{request['fromDate']}. Error message: {str(reply)}"
+                )
+                failed.append(request)
+        if failed:
+            raise IncompleteHistory(
+                failed,
+                [None if isinstance(r, Exception) else r for r in replies],
+            )
+
+        decoders = []
+        prefixes = []
+        for position, active in enumerate(actives):
+            chunks = replies[position * len(windows) : (position + 1) * len(windows)]
+            decoder = HistoryDecoder(chartTF, real_volume=self.real_volume)
+            for data in chunks:
+                if isinstance(data, dict) and data.get("data") is not None:
+                    decoder.append(data["data"])
+            if not len(decoder):
+                if position == 0:
+                    return None
+                continue
+            decoders.append(decoder)
+            prefixes.append(None if position == 0 else active.lower())
+        if not decoders:
+            return None
+        return align(decoders, prefixes, how=how)
+
+    async def __brokerTimeDelta(self, m):
+        if self.clock.expired():
+            for _ in range(self.clock.samples):
+                sent = time.time()
+                reply = await self.accountInfo()
+                self.clock.sample(reply, sent, time.time())
+            self.clock.commit()
+        return self.clock.now() - timedelta(days=m)
+
+    # convert date to the local midnight timestamp used by the EA
+    def __date_to_timestamp(self, s):
+        return time.mktime(datetime(s.year, s.month, s.day).timetuple())
+
+    def close(self):
+        self.__api.close()
@@ -0,0 +1,114 @@
+from collections import deque
+from threading import Lock
+import logging
+
+from .history import TIMEFRAMES
+from .resample import bucket
+from .stream import Bar, Trade, to_frame
+
+
+class BarBuilder:
+    """Build candles of several timeframes at once from the tick stream
+
+    A candle closes with the first tick of the next one, then every on_close
+    callback gets (symbol, chartTF, bar). Bars use bid, or last for TS, the
+    tick count (TS volume) as volume and the lowest spread, in points when
+    point is given.
+    """
+
+    def __init__(self, timeframes, offset=0, point=None, maxlen=1000):
+        for chartTF in timeframes:
+            if chartTF not in TIMEFRAMES:
+                raise KeyError(f"Unknown timeframe {chartTF}")
+        self.timeframes = list(timeframes)
+        self.offset = offset
+        self.point = point
+        self.maxlen = maxlen
+        self.__forming = {}
+        self.__closed = {}
+        self.__callbacks = []
+        self.__lock = Lock()
+
+    def on_close(self, callback):
+        self.__callbacks.append(callback)
+        return callback
+
+    def update(self, record):
+        """Add one Tick or Trade record to every timeframe"""
+        if isinstance(record, Trade) and record.last:
+            price = record.last
+            volume = record.volume
+        else:
+            price = record.bid
+            volume = 1
+        spread = record.ask - record.bid
+        if self.point:
+            spread = round(spread / self.point)
+        second = record.time // 1000
+
+        closed = []
+        with self.__lock:
+            for chartTF in self.timeframes:
+                key = (record.symbol, chartTF)
+                start = bucket(second, chartTF, self.offset)
+                bar = self.__forming.get(key)
+                if bar is not None and bar[0] == start:
+                    if price > bar[2]:
+                        bar[2] = price
+                    if price < bar[3]:
+                        bar[3] = price
+                    bar[4] = price
+                    bar[5] += volume
+                    if spread < bar[6]:
+                        bar[6] = spread
+                    continue
+                if bar is not None:
+                    if bar[0] > start:
+                        # late tick of a candle already closed
+                        continue
+                    done = Bar(record.symbol, *bar)
+                    self.__closed.setdefault(key, deque(maxlen=self.maxlen)).append(
+                        done
+                    )
+                    closed.append((record.symbol, chartTF, done))
+                self.__forming[key] = [
+                    start,
+                    price,
+                    price,
+                    price,
+                    price,
+                    volume,
+                    spread,
+                ]
+
+        # callbacks run on the reader thread, one failing must not stop the
+        # others or the records still to dispatch
+        for symbol, chartTF, bar in closed:
+            for callback in self.__callbacks:
+                try:
+                    callback(symbol, chartTF, bar)
+                except Exception as e:
+                    logging.info(f"Error in bar callback. Error message: {str(e)}")
+
+    def forming(self, symbol, chartTF):
+        """Candle in progress"""
+        with self.__lock:
+            bar = self.__forming.get((symbol, chartTF))
+            return Bar(symbol, *bar) if bar is not None else None
+
+    def closed(self, symbol, chartTF, n=None):
+        """Newest n closed candles"""
+        with self.__lock:
+            bars = list(self.__closed.get((symbol, chartTF), ()))
+        return bars if n is None else bars[-n:]
+
+    def frame(self, symbol, chartTF, n=None, forming=True):
+        """Closed candles and the one in progress as a DataFrame"""
+        bars = self.closed(symbol, chartTF, n)
+        current = self.forming(symbol, chartTF) if forming else None
+        if current is not None:
+            bars.append(current)
+        df = to_frame(bars)
+        if len(df):
+            del df["symbol"]
+        return df
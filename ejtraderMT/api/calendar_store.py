@@ -0,0 +1,122 @@
+from threading import Lock
+import glob
+import os
+
+import pandas as pd
+
+from .utils import add_ranges, atomic_write, read_ranges
+
+COLUMNS = [
+    "date",
+    "currency",
+    "impact",
+    "event",
+    "country",
+    "actual",
+    "forecast",
+    "previous",
+]
+
+
+def calendar_frame(rows):
+    """Events DataFrame indexed by date from the rows of a CALENDAR reply"""
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.dropna(subset=["date"])
+    return df.set_index("date")
+
+
+class CalendarStore:
+    """Economic calendar events on disk, one pickle per symbol and month
+
+    Months read once stay in memory, so repeated queries over the same window
+    never read the files again nor ask the terminal. `ranges` keeps the days already
+    downloaded so only new days are fetched.
+    """
+
+    def __init__(self, path="DataBase/calendar"):
+        self.path = path
+        self.__months = {}
+        self.__listing = {}
+        self.__lock = Lock()
+
+    def __folder(self, symbol):
+        return os.path.join(self.path, symbol or "ALL")
+
+    def __month(self, symbol, month):
+        key = (symbol, month)
+        df = self.__months.get(key)
+        if df is None:
+            filename = os.path.join(self.__folder(symbol), f"{month}.pkl")
+            df = pd.read_pickle(filename) if os.path.exists(filename) else None
+            self.__months[key] = df
+        return df
+
+    def months(self, symbol):
+        listing = self.__listing.get(symbol)
+        if listing is None:
+            listing = self.__listing[symbol] = {
+                os.path.basename(f)[:-4]
+                for f in glob.glob(os.path.join(self.__folder(symbol), "*.pkl"))
+            }
+        return sorted(listing)
+
+    def write(self, symbol, df):
+        """Upsert events, the days in df replace what was stored for them"""
+        if df is None or not len(df):
+            return
+        folder = self.__folder(symbol)
+        os.makedirs(folder, exist_ok=True)
+        df = df.sort_index()
+        keys = df.index.strftime("%Y-%m")
+        with self.__lock:
+            for month in pd.unique(keys):
+                part = df[keys == month]
+                stored = self.__month(symbol, month)
+                if stored is not None:
+                    # a day fetched again replaces its events, actual values change
+                    days = stored.index.normalize().isin(
+                        part.index.normalize().unique()
+                    )
+                    part = pd.concat([stored[~days], part]).sort_index(kind="stable")
+                filename = os.path.join(folder, f"{month}.pkl")
+                atomic_write(filename, part.to_pickle, binary=True)
+                self.__months[(symbol, month)] = part
+                self.months(symbol)
+                self.__listing[symbol].add(month)
+
+    def query(self, symbol, fromDate=None, toDate=None, currency=None, impact=None):
+        """Events between two datetimes, toDate excluded, filtered by currency or impact"""
+        months = self.months(symbol)
+        if fromDate is not None:
+            first = pd.Timestamp(fromDate).strftime("%Y-%m")
+            months = [m for m in months if m >= first]
+        if toDate is not None:
+            last = pd.Timestamp(toDate).strftime("%Y-%m")
+            months = [m for m in months if m <= last]
+        with self.__lock:
+            parts = [self.__month(symbol, month) for month in months]
+        parts = [part for part in parts if part is not None and len(part)]
+        if not parts:
+            return pd.DataFrame(
+                columns=COLUMNS[1:], index=pd.DatetimeIndex([], name="date")
+            )
+        df = pd.concat(parts)
+        index = df.index
+        lo = index.searchsorted(pd.Timestamp(fromDate)) if fromDate is not None else 0
+        hi = index.searchsorted(pd.Timestamp(toDate)) if toDate is not None else len(df)
+        df = df.iloc[lo:hi]
+        if currency is not None:
+            currency = [currency] if isinstance(currency, str) else currency
+            df = df[df["currency"].isin(currency)]
+        if impact is not None:
+            impact = impact if isinstance(impact, (list, tuple, set)) else [impact]
+            df = df[df["impact"].astype(str).isin([str(i) for i in impact])]
+        return df
+
+    def ranges(self, symbol):
+        """Day ranges already downloaded as timestamps"""
+        return read_ranges(self.__folder(symbol))
+
+    def add_ranges(self, symbol, ranges):
+        add_ranges(self.__folder(symbol), ranges)
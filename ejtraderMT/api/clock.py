@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from threading import Lock
+import logging
+import time
+
+import zmq
+
+from .utils import WEEK_ANCHOR
+
+# DST switches happen on weekends so a new Sunday-anchored week means the
+# broker offset may have changed
+WEEK = 7 * 86400
+
+
+def broker_timestamp(reply):
+    """Broker time of an ACCOUNT reply as seconds since the epoch"""
+    try:
+        broker = datetime.strptime(reply["time"], "%Y.%m.%d %H:%M:%S")
+    except (KeyError, TypeError):
+        raise zmq.NotDone("Metatrader 5 Server is disconnect")
+    return (broker - datetime(1970, 1, 1)).total_seconds()
+
+
+class BrokerClock:
+    """Broker time served locally from a cached offset to the UTC clock
+
+    The offset is measured from a few ACCOUNT round trips, keeping the one with
+    the shortest round trip and assuming the broker stamped it halfway. It is
+    measured again after `refresh` seconds or when a weekend passed, when
+    brokers switch daylight saving time.
+    """
+
+    def __init__(self, account=None, samples=3, refresh=3600):
+        self.account = account
+        self.samples = samples
+        self.refresh = refresh
+        # broker minus UTC in seconds, None until measured
+        self.offset = None
+        self.rtt = None
+        self.__synced = None
+        self.__week = None
+        self.__best = None
+        self.__lock = Lock()
+
+    def sample(self, reply, sent, received):
+        """Feed one ACCOUNT reply with the wall clock times around its round trip"""
+        broker = broker_timestamp(reply)
+        rtt = received - sent
+        if self.__best is None or rtt < self.__best[1]:
+            self.__best = (broker + 0.5 - (sent + received) / 2, rtt)
+
+    def commit(self):
+        """Make the best sample so far the offset in use"""
+        if self.__best is None:
+            return
+        self.offset, self.rtt = self.__best
+        self.__best = None
+        self.__synced = time.monotonic()
+        self.__week = self.week(time.time())
+
+    def sync(self):
+        """Measure the offset now with `samples` round trips"""
+        with self.__lock:
+            for _ in range(self.samples):
+                sent = time.time()
+                reply = self.account()
+                self.sample(reply, sent, time.time())
+            self.commit()
+        return self.offset
+
+    @staticmethod
+    def week(timestamp):
+        return int((timestamp - WEEK_ANCHOR) // WEEK)
+
+    def expired(self):
+        if self.offset is None:
+            return True
+        if time.monotonic() - self.__synced > self.refresh:
+            return True
+        return self.week(time.time()) != self.__week
+
+    def ensure(self):
+        """Measure the offset when missing or expired, keep the old one on failure"""
+        if not self.expired():
+            return
+        try:
+            self.sync()
+        except Exception as e:
+            if self.offset is None:
+                raise
+            logging.info(f"Keeping the last broker offset. Error message: {str(e)}")
+
+    @property
+    def utc_offset(self):
+        """Broker timezone offset in seconds rounded to the minute"""
+        self.ensure()
+        return int(round(self.offset / 60)) * 60
+
+    def timestamp(self):
+        """Broker time now as seconds since the epoch"""
+        self.ensure()
+        return time.time() + self.offset
+
+    def now(self):
+        """Broker time now as a naive datetime, without a network call"""
+        return datetime(1970, 1, 1) + timedelta(seconds=int(self.timestamp()))
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+# HISTORY rows sent by the EA
+# bars: [time, open, high, low, close, tick_volume, real_volume, spread]
+# ticks: [time_msc, bid, ask]
+# time and sales: [time_msc, type, bid, ask, last, volume]
+BARS = ("open", "high", "low", "close", "volume", "spread")
+TICKS = ("bid", "ask")
+TS = ("type", "bid", "ask", "last", "volume")
+
+
+class HistoryDecoder:
+    """Accumulate HISTORY replies into NumPy columns and build one DataFrame at the end"""
+
+    def __init__(self, chartTF, real_volume=False, capacity=None):
+        self.chartTF = chartTF
+        # TICK and TS times are in ms, bars in s
+        self.tick = chartTF in ("TICK", "TS")
+        if chartTF == "TICK":
+            self.columns = TICKS
+            self.__source = (1, 2)
+            self.__fields = TICKS
+            dtypes = (np.float64, np.float64)
+        elif chartTF == "TS":
+            self.columns = TS
+            self.__source = (1, 2, 3, 4, 5)
+            self.__fields = TS
+            dtypes = (np.int64,) + (np.float64,) * 4
+        else:
+            self.columns = BARS
+            self.__source = (1, 2, 3, 4, 6 if real_volume else 5, 7)
+            self.__fields = BARS[:4] + (
+                "real_volume" if real_volume else "tick_volume",
+                "spread",
+            )
+            dtypes = (np.float64,) * 4 + (np.int64, np.int64)
+
+        capacity = capacity or 1024
+        self.size = 0
+        self.__time = np.empty(capacity, dtype=np.int64)
+        self.__values = [np.empty(capacity, dtype=dtype) for dtype in dtypes]
+
+    def __len__(self):
+        return self.size
+
+    def __reserve(self, rows):
+        needed = self.size + rows
+        capacity = len(self.__time)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        time = np.empty(capacity, dtype=np.int64)
+        time[: self.size] = self.__time[: self.size]
+        self.__time = time
+        for i, column in enumerate(self.__values):
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self.size] = column[: self.size]
+            self.__values[i] = grown
+
+    def append(self, rows):
+        """Append the list of rows or the binary records of one HISTORY reply"""
+        if rows is None or len(rows) == 0:
+            return
+        if isinstance(rows, np.ndarray) and rows.dtype.names:
+            self.extend(rows["time"], *(rows[name] for name in self.__fields))
+            return
+        block = np.asarray(rows, dtype=np.float64)
+        if block.ndim != 2:
+            raise ValueError("HISTORY reply is not a list of rows")
+        self.extend(block[:, 0], *(block[:, i] for i in self.__source))
+
+    def extend(self, time, *columns):
+        """Append already columnar data, time in s for bars and ms for ticks"""
+        rows = len(time)
+        self.__reserve(rows)
+        end = self.size + rows
+        self.__time[self.size : end] = time
+        for target, column in zip(self.__values, columns):
+            target[self.size : end] = column
+        self.size = end
+
+    def arrays(self, dedupe=True):
+        """Time and value columns sorted by time, duplicated timestamps keep the first"""
+        time = self.__time[: self.size]
+        values = [column[: self.size] for column in self.__values]
+        if self.size > 1 and np.any(time[1:] < time[:-1]):
+            order = np.argsort(time, kind="stable")
+            time = time[order]
+            values = [column[order] for column in values]
+        if dedupe and self.size > 1:
+            keep = np.empty(self.size, dtype=bool)
+            keep[0] = True
+            np.not_equal(time[1:], time[:-1], out=keep[1:])
+            if not keep.all():
+                time = time[keep]
+                values = [column[keep] for column in values]
+        return time, values
+
+    def frame(self, prefix=None, dedupe=True):
+        """Build the DataFrame indexed by date"""
+        time, values = self.arrays(dedupe=dedupe)
+        index = pd.DatetimeIndex(
+            pd.to_datetime(time, unit="ms" if self.tick else "s"), name="date"
+        )
+        columns = [f"{prefix}_{c}" if prefix else c for c in self.columns]
+        return pd.DataFrame(dict(zip(columns, values)), index=index, copy=False)
+
+
+def align(decoders, prefixes, how="inner"):
+    """Join several decoded symbols on time at once
+
+    how: inner keeps common timestamps, outer keeps every timestamp with NaN
+    where a symbol has no row, asof keeps the first symbol timestamps and takes
+    the last known row of the others.
+    """
+    if how not in ("inner", "outer", "asof"):
+        raise ValueError("how must be inner, outer or asof")
+    arrays = [decoder.arrays() for decoder in decoders]
+    times = [time for time, _ in arrays]
+    if how == "inner":
+        index = times[0]
+        for time in times[1:]:
+            index = np.intersect1d(index, time, assume_unique=True)
+    elif how == "outer":
+        index = times[0]
+        for time in times[1:]:
+            index = np.union1d(index, time)
+    else:
+        index = times[0]
+
+    columns = {}
+    for decoder, prefix, (time, values) in zip(decoders, prefixes, arrays):
+        names = [f"{prefix}_{c}" if prefix else c for c in decoder.columns]
+        if how == "asof":
+            position = np.searchsorted(time, index, side="right") - 1
+            found = position >= 0
+        else:
+            position = np.searchsorted(time, index)
+            found = position < len(time)
+            found[found] = time[position[found]] == index[found]
+        position[~found] = 0
+        for name, column in zip(names, values):
+            if found.all():
+                columns[name] = column[position]
+            else:
+                # rows missing for this symbol become NaN
+                aligned = column[position].astype(np.float64)
+                aligned[~found] = np.nan
+                columns[name] = aligned
+
+    tick = decoders[0].tick
+    date = pd.DatetimeIndex(
+        pd.to_datetime(index, unit="ms" if tick else "s"), name="date"
+    )
+    return pd.DataFrame(columns, index=date, copy=False)
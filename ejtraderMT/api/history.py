@@ -0,0 +1,285 @@
+from datetime import timedelta
+from queue import Queue, Empty
+from threading import Lock, Thread
+import logging
+import time
+
+import zmq
+
+from .wire import count_rows
+
+# seconds per timeframe
+TIMEFRAMES = {
+    "M1": 60,
+    "M2": 120,
+    "M3": 180,
+    "M4": 240,
+    "M5": 300,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H4": 14400,
+    "D1": 86400,
+    "W1": 604800,
+    "MN": 2629746,
+}
+
+
+class AdaptiveChunker:
+    """Hand out history windows sized from the timeframe and the replies seen
+
+    The first window holds about `first` candles of chartTF (TICK assumes
+    `tick_rate` ticks per second), at most `rows`. After each reply the window
+    grows towards `rows` candles at the observed rows per second and shrinks
+    when a reply takes longer than `latency` seconds. Timestamps are in
+    seconds.
+    """
+
+    def __init__(
+        self,
+        begin,
+        end,
+        chartTF,
+        rows=50000,
+        latency=2.0,
+        tick_rate=2.0,
+        minimum=60,
+        maximum=None,
+        first=5000,
+    ):
+        self.begin = begin
+        self.end = end
+        self.rows = rows
+        self.latency = latency
+        self.minimum = minimum
+        self.maximum = maximum or max(end - begin, minimum)
+        # small until a reply shows how fast the terminal answers
+        first = min(first, rows)
+        if chartTF in ("TICK", "TS"):
+            window = first / tick_rate
+        else:
+            window = first * TIMEFRAMES[chartTF]
+        self.window = self.__clamp(window)
+        self.__cursor = begin
+        self.__lock = Lock()
+
+    def __clamp(self, window):
+        return min(max(window, self.minimum), self.maximum)
+
+    def next(self):
+        """Next (fromDate, toDate) window, None once the range is covered"""
+        with self.__lock:
+            if self.__cursor >= self.end:
+                return None
+            begin = self.__cursor
+            self.__cursor = min(begin + self.window, self.end)
+            return begin, self.__cursor
+
+    def observe(self, window, rows, elapsed):
+        """Resize the next windows from the rows and time a reply took"""
+        begin, end = window
+        span = max(end - begin, 1)
+        with self.__lock:
+            if rows:
+                target = self.rows * span / rows
+            else:
+                # weekends and holidays, move on faster
+                target = span * 2
+            if elapsed > self.latency:
+                target = min(target, span * self.latency / elapsed)
+            # change at most 4x per reply so one odd reply does not swing it
+            target = min(max(target, self.window / 4), self.window * 4)
+            self.window = self.__clamp(target)
+
+
+class IncompleteHistory(zmq.NotDone):
+    """Some history requests got no reply, the data would have gaps
+
+    `failed` holds the Command kwargs that failed and `replies` what fetch
+    would have returned, None in place of each failed reply.
+    """
+
+    def __init__(self, failed, replies):
+        self.failed = failed
+        self.replies = replies
+        first = failed[0]
+        super().__init__(
+            f"{len(failed)} history requests failed, first {first.get('symbol')} "
+            f"from {first.get('fromDate')} to {first.get('toDate')}"
+        )
+
+
+class HistoryEngine:
+    """Fetch history chunks concurrently over a pool of REQ sockets"""
+
+    def __init__(self, pool, attempts=2):
+        self.pool = pool
+        # timeouts are already retried with backoff by the connection's
+        # RetryPolicy and never sent again here, these attempts cover any
+        # other failure of a chunk
+        self.attempts = attempts
+
+    @staticmethod
+    def chunks(start_date, end_date, delta=None):
+        """Split a date range into consecutive (fromDate, toDate) windows"""
+        delta = delta or timedelta(days=1)
+        windows = []
+        while start_date <= end_date:
+            windows.append((start_date, start_date + delta))
+            start_date += delta
+        return windows
+
+    def fetch(self, requests, pbar=None, decode=None):
+        """Send a list of Command kwargs concurrently, replies keep the input order
+
+        With decode the raw frames of each reply are passed to decode(frames)
+        as soon as they arrive and its result takes the place of the reply.
+        Raises IncompleteHistory once every request is done if any got no reply.
+        """
+        tasks = Queue()
+        for index, request in enumerate(requests):
+            tasks.put((index, request))
+        replies = [None] * len(requests)
+
+        workers = [
+            Thread(
+                target=self.__worker, args=(tasks, replies, pbar, decode), daemon=True
+            )
+            for _ in range(min(self.pool.size, len(requests)))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        failed = [request for request, reply in zip(requests, replies) if reply is None]
+        if failed:
+            raise IncompleteHistory(failed, replies)
+        return replies
+
+    def fetch_adaptive(self, chunkers, request, pbar=None, decode=None):
+        """Fetch every window of a dict of AdaptiveChunker concurrently
+
+        request(key, begin, end) builds the Command kwargs. Returns for each key
+        the ((begin, end), reply) pairs in time order, decode and failures work
+        as in fetch.
+        """
+        results = {key: [] for key in chunkers}
+        keys = list(chunkers)
+        turn = [0]
+        lock = Lock()
+
+        def take():
+            # round robin over the chunkers that still have windows
+            with lock:
+                for _ in range(len(keys)):
+                    key = keys[turn[0] % len(keys)]
+                    turn[0] += 1
+                    window = chunkers[key].next()
+                    if window is not None:
+                        return key, window
+            return None
+
+        def worker():
+            with self.pool.connection() as api:
+                while True:
+                    task = take()
+                    if task is None:
+                        return
+                    key, window = task
+                    started = time.time()
+                    reply = self.__request(
+                        api, request(key, *window), raw=decode is not None
+                    )
+                    rows = 0
+                    if decode is not None:
+                        if reply is not None:
+                            rows = count_rows(reply)
+                            reply = self.__decode(decode, reply)
+                    elif isinstance(reply, dict) and reply.get("data") is not None:
+                        rows = len(reply["data"])
+                    chunkers[key].observe(window, rows, time.time() - started)
+                    with lock:
+                        results[key].append((window, reply))
+                    if pbar is not None:
+                        pbar.update((window[1] - window[0]) / 86400)
+
+        workers = [Thread(target=worker, daemon=True) for _ in range(self.pool.size)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        failed = []
+        for key in results:
+            results[key].sort(key=lambda item: item[0][0])
+            failed += [
+                request(key, *window) for window, reply in results[key] if reply is None
+            ]
+        if failed:
+            raise IncompleteHistory(failed, results)
+        return results
+
+    def __worker(self, tasks, replies, pbar, decode):
+        with self.pool.connection() as api:
+            while True:
+                try:
+                    index, request = tasks.get_nowait()
+                except Empty:
+                    return
+                reply = self.__request(api, request, raw=decode is not None)
+                if decode is not None and reply is not None:
+                    reply = self.__decode(decode, reply)
+                replies[index] = reply
+                if pbar is not None:
+                    pbar.update(1)
+
+    @staticmethod
+    def __decode(decode, frames):
+        try:
+            return decode(frames)
+        except Exception as e:
+            logging.info(f"Error while decoding a reply. Error message: {str(e)}")
+            return None
+
+    def __request(self, api, request, raw=False):
+        symbol = request.get("symbol")
+        send = api.Frames if raw else api.Command
+        for attempt in range(self.attempts):
+            if attempt and getattr(api, "metrics", None) is not None:
+                api.metrics.count(
+                    request.get("action"), request.get("actionType"), "retries"
+                )
+            try:
+                return send(**request)
+            except zmq.NotDone as e:
+                # resending would only queue more work behind the late one
+                logging.info(
+                    f"No reply for {symbol} from {request.get('fromDate')}. Error message: {str(e)}"
+                )
+                return None
+            except Exception as e:
+                logging.info(
+                    f"Error while processing {symbol} from {request.get('fromDate')}. Error message: {str(e)}"
+                )
+        logging.info(f"Check if {symbol} is avalible from {request.get('fromDate')}")
+        return None
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or touching [begin, end] ranges"""
+    merged = []
+    for begin, end in sorted(ranges):
+        if merged and begin <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([begin, end])
+    return merged
+
+
+def missing_ranges(windows, covered):
+    """Windows not fully inside one of the covered ranges"""
+    covered = merge_ranges(covered)
+    missing = []
+    for begin, end in windows:
+        if not any(a <= begin and end <= b for a, b in covered):
+            missing.append((begin, end))
+    return missing
@@ -0,0 +1,156 @@
+from threading import Lock
+
+import pandas as pd
+
+# 64 linear sub-buckets per power of two, values within 1.6% of their bucket
+SUB_BITS = 7
+HALF = 1 << (SUB_BITS - 1)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """HDR-style log-linear histogram of durations recorded in microseconds
+
+    Memory stays bounded whatever the range of values, percentiles are the
+    highest value of the bucket they fall in.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.__lock = Lock()
+
+    @staticmethod
+    def index(value):
+        exponent = max(value.bit_length() - SUB_BITS, 0)
+        return exponent * HALF + (value >> exponent)
+
+    @staticmethod
+    def highest(index):
+        """Largest value that falls in a bucket"""
+        if index < 2 * HALF:
+            return index
+        exponent = index // HALF - 1
+        return ((index - exponent * HALF + 1) << exponent) - 1
+
+    def record(self, seconds):
+        value = max(int(seconds * 1e6), 0)
+        index = self.index(value)
+        with self.__lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+            self.min = value if self.min is None else min(self.min, value)
+
+    def percentile(self, q):
+        """Duration in seconds below which a fraction q of the records fall"""
+        with self.__lock:
+            if not self.count:
+                return None
+            rank = max(int(q * self.count + 0.5), 1)
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= rank:
+                    return min(self.highest(index), self.max) / 1e6
+        return self.max / 1e6
+
+    def mean(self):
+        return self.total / self.count / 1e6 if self.count else None
+
+
+class Metrics:
+    """Command timings and failure counters per action and actionType
+
+    Every phase of a round trip gets a histogram: send is the time to queue
+    the request, wait until the reply arrives, decode to parse it and total
+    the whole call. Counters track timeouts, error replies and retries.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.__lock = Lock()
+
+    def observe(self, action, actionType, phase, seconds):
+        key = (action, actionType, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.__lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        histogram.record(seconds)
+
+    def count(self, action, actionType, name, n=1):
+        key = (action, actionType, name)
+        with self.__lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def percentile(self, action, actionType=None, q=0.99, phase="total"):
+        """Duration in seconds of a percentile, None when nothing was recorded"""
+        histogram = self.histograms.get((action, actionType, phase))
+        return histogram.percentile(q) if histogram is not None else None
+
+    def summary(self):
+        """DataFrame of counts, mean and percentiles in milliseconds"""
+        rows = []
+        for (action, actionType, phase), histogram in sorted(
+            self.histograms.items(), key=lambda item: tuple(map(str, item[0]))
+        ):
+            row = {
+                "action": action,
+                "actionType": actionType,
+                "phase": phase,
+                "count": histogram.count,
+                "mean": histogram.mean() * 1e3,
+                "min": histogram.min / 1e3,
+                "max": histogram.max / 1e3,
+            }
+            for q in QUANTILES:
+                row[f"p{q * 100:g}"] = histogram.percentile(q) * 1e3
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def prometheus(self, prefix="ejtradermt"):
+        """Prometheus text exposition of the timings and counters"""
+        lines = [
+            f"# HELP {prefix}_command_seconds Command round trip phases",
+            f"# TYPE {prefix}_command_seconds summary",
+        ]
+        for (action, actionType, phase), histogram in sorted(
+            self.histograms.items(), key=lambda item: tuple(map(str, item[0]))
+        ):
+            labels = (
+                f'action="{action}",action_type="{actionType or ""}",phase="{phase}"'
+            )
+            for q in QUANTILES:
+                lines.append(
+                    f'{prefix}_command_seconds{{{labels},quantile="{q}"}} '
+                    f"{histogram.percentile(q)}"
+                )
+            lines.append(
+                f"{prefix}_command_seconds_sum{{{labels}}} {histogram.total / 1e6}"
+            )
+            lines.append(
+                f"{prefix}_command_seconds_count{{{labels}}} {histogram.count}"
+            )
+        lines += [
+            f"# HELP {prefix}_command_failures_total Timeouts, error replies and retries",
+            f"# TYPE {prefix}_command_failures_total counter",
+        ]
+        for (action, actionType, name), value in sorted(
+            self.counters.items(), key=lambda item: tuple(map(str, item[0]))
+        ):
+            lines.append(
+                f'{prefix}_command_failures_total{{action="{action}",'
+                f'action_type="{actionType or ""}",kind="{name}"}} {value}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.__lock:
+            self.histograms = {}
+            self.counters = {}
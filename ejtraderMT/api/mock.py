@@ -0,0 +1,405 @@
+from datetime import datetime, timedelta, timezone
+from collections import Counter
+from threading import Thread, Event
+import itertools
+import json
+import time
+import zlib
+
+import numpy as np
+import zmq
+
+from .history import TIMEFRAMES
+from .wire import BARS, TS, DTYPES, kind_of, encode_reply
+
+# symbol, expiration, type as listed by LISTSYMBOLS
+SYMBOLS = [
+    ["EURUSD", "1970.01.01 00:00", "FOREX"],
+    ["GBPUSD", "1970.01.01 00:00", "FOREX"],
+    ["USDJPY", "1970.01.01 00:00", "FOREX"],
+    ["AUDUSD", "1970.01.01 00:00", "FOREX"],
+    ["XAUUSD", "1970.01.01 00:00", "METALS"],
+    ["US500", "1970.01.01 00:00", "INDICES"],
+    ["WINJ21", "2021.04.14 18:00", "FUTURES"],
+]
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "AUD"]
+COUNTRIES = ["United States", "European Union", "United Kingdom", "Japan", "Australia"]
+EVENTS = ["CPI m/m", "GDP q/q", "Interest Rate Decision", "Retail Sales m/m", "PMI"]
+IMPACTS = ["LOW", "MEDIUM", "HIGH"]
+
+
+class MockServer:
+    """Local stand-in for the MT5 EA with synthetic data
+
+    Answers ACCOUNT, BALANCE, HISTORY, CALENDAR, LISTSYMBOLS, POSITIONS,
+    ORDERS, TRADE and CONFIG on the command socket. Symbols subscribed with
+    CONFIG get synthetic prices on the live socket every stream_interval
+    seconds, as fast as possible with 0, and trades are published on the
+    events socket.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=15557,
+        tick_interval=1000,
+        delay=0,
+        live_port=None,
+        events_port=None,
+        stream_interval=0.1,
+    ):
+        self.HOST = host
+        self.SYS_PORT = port
+        # next to the REQ port like a terminal, 15556 and 15558 by default
+        self.LIVE_PORT = live_port or port - 1
+        self.EVENTS_PORT = events_port or port + 1
+        # milliseconds between synthetic ticks
+        self.tick_interval = tick_interval
+        # seconds to wait before each reply
+        self.delay = delay
+        # seconds between live messages of each subscription
+        self.stream_interval = stream_interval
+        self.handlers = {
+            "ACCOUNT": self.account,
+            "BALANCE": self.account,
+            "HISTORY": self.history,
+            "CALENDAR": self.calendar,
+            "LISTSYMBOLS": self.symbols,
+            "POSITIONS": self.positions,
+            "ORDERS": self.orders,
+            "TRADE": self.trade,
+            "CONFIG": self.config,
+        }
+        self.subscriptions = set()
+        self.prices = {}
+        self.open_positions = {}
+        self.open_orders = {}
+        # live messages not sent because no client was reading
+        self.dropped = 0
+        self.published = 0
+        # requests answered per action
+        self.served = Counter()
+        self.__tickets = itertools.count(1000)
+        self.__stop = Event()
+        self.__thread = None
+        self.__publisher = None
+
+    def start(self):
+        context = zmq.Context.instance()
+        self.sys_socket = context.socket(zmq.REP)
+        self.sys_socket.LINGER = 0
+        self.sys_socket.bind("tcp://{}:{}".format(self.HOST, self.SYS_PORT))
+        self.live_socket = context.socket(zmq.PUSH)
+        self.live_socket.LINGER = 0
+        self.live_socket.bind("tcp://{}:{}".format(self.HOST, self.LIVE_PORT))
+        self.events_socket = context.socket(zmq.PUSH)
+        self.events_socket.LINGER = 0
+        self.events_socket.bind("tcp://{}:{}".format(self.HOST, self.EVENTS_PORT))
+        self.__stop.clear()
+        self.__thread = Thread(target=self.__serve, daemon=True)
+        self.__thread.start()
+        self.__publisher = Thread(target=self.__publish, daemon=True)
+        self.__publisher.start()
+        return self
+
+    def stop(self):
+        self.__stop.set()
+        for thread in (self.__thread, self.__publisher):
+            if thread is not None:
+                thread.join()
+        self.sys_socket.close()
+        self.live_socket.close()
+        self.events_socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __serve(self):
+        poller = zmq.Poller()
+        poller.register(self.sys_socket, zmq.POLLIN)
+        while not self.__stop.is_set():
+            if not poller.poll(100):
+                continue
+            request = json.loads(self.sys_socket.recv())
+            if self.delay:
+                self.__stop.wait(self.delay)
+            handler = self.handlers.get(request.get("action"))
+            self.served[request.get("action")] += 1
+            if handler is None:
+                frames = encode_reply({"error": True, "description": "UNKNOWN_ACTION"})
+            else:
+                frames = handler(request)
+            self.sys_socket.send_multipart(frames)
+
+    def __publish(self):
+        """Push a synthetic price for every CONFIG subscription"""
+        rng = np.random.default_rng(0)
+        while not self.__stop.is_set():
+            subscriptions = list(self.subscriptions)
+            if not subscriptions:
+                self.__stop.wait(0.01)
+                continue
+            for symbol, chartTF in subscriptions:
+                msg = {
+                    "symbol": symbol,
+                    "timeframe": chartTF,
+                    "data": self.live_row(symbol, chartTF, rng),
+                }
+                try:
+                    self.live_socket.send_json(msg, zmq.NOBLOCK)
+                    self.published += 1
+                except zmq.Again:
+                    self.dropped += 1
+            if self.stream_interval:
+                self.__stop.wait(self.stream_interval)
+
+    def live_row(self, symbol, chartTF, rng):
+        price = self.prices.get(symbol, 1.0) + rng.normal(0, 0.0001)
+        self.prices[symbol] = price
+        now = int(time.time() * 1000)
+        if chartTF == "TICK":
+            return [now, price, price + 0.0001]
+        if chartTF == "TS":
+            return [now, 0, price, price + 0.0001, price, 1.0]
+        size = TIMEFRAMES.get(chartTF, 60)
+        return [now // 1000 // size * size, price, price, price, price, 1, 1000, 1]
+
+    def __publish_event(self, request, result):
+        """Publish like the EA's OnTradeTransaction, MqlTradeRequest and result"""
+        try:
+            self.events_socket.send_json(
+                {"request": request, "result": result}, zmq.NOBLOCK
+            )
+        except zmq.Again:
+            pass
+
+    def account(self, request):
+        return encode_reply(
+            {
+                "broker": "MockServer",
+                "currency": "USD",
+                "server": "MockServer-Demo",
+                "balance": 10000.0,
+                "equity": 10000.0,
+                "margin": 0.0,
+                "margin_free": 10000.0,
+                "margin_level": 0.0,
+                "time": datetime.now(timezone.utc).strftime("%Y.%m.%d %H:%M:%S"),
+            }
+        )
+
+    def history(self, request):
+        kind = kind_of(request.get("chartTF"))
+        records = self.records(
+            request.get("symbol"),
+            request.get("chartTF"),
+            int(request.get("fromDate") or 0),
+            int(request.get("toDate") or 0),
+        )
+        if request.get("encoding") == "binary":
+            return encode_reply({}, kind=kind, records=records)
+        return encode_reply({"data": records.tolist()})
+
+    def records(self, symbol, chartTF, fromDate, toDate):
+        """Deterministic random walk for a symbol between two timestamps"""
+        kind = kind_of(chartTF)
+        if kind == BARS:
+            time = np.arange(fromDate, toDate, TIMEFRAMES.get(chartTF, 60))
+        else:
+            time = np.arange(fromDate * 1000, toDate * 1000, self.tick_interval)
+        seed = zlib.crc32(f"{symbol}{chartTF}{fromDate}".encode())
+        rng = np.random.default_rng(seed)
+        price = 1.0 + np.cumsum(rng.normal(0, 0.0001, len(time)))
+        records = np.zeros(len(time), dtype=DTYPES[kind])
+        records["time"] = time
+        if kind == BARS:
+            spread = rng.normal(0, 0.0001, (len(time), 2))
+            records["open"] = price
+            records["close"] = price + spread[:, 0]
+            records["high"] = np.maximum(records["open"], records["close"]) + abs(
+                spread[:, 1]
+            )
+            records["low"] = np.minimum(records["open"], records["close"]) - abs(
+                spread[:, 1]
+            )
+            records["tick_volume"] = rng.integers(1, 100, len(time))
+            records["real_volume"] = records["tick_volume"] * 1000
+            records["spread"] = rng.integers(0, 20, len(time))
+        else:
+            records["bid"] = price
+            records["ask"] = price + 0.0001
+            if kind == TS:
+                records["type"] = rng.integers(0, 2, len(time))
+                records["last"] = price
+                records["volume"] = 1.0
+        return records
+
+    def calendar(self, request):
+        """A few deterministic events per day between fromDate and toDate"""
+        begin = int(request.get("fromDate") or 0)
+        end = int(request.get("toDate") or 0)
+        rows = []
+        day = begin // 86400 * 86400
+        while day < end:
+            rng = np.random.default_rng(day)
+            for hour in sorted(rng.choice(24, 3, replace=False)):
+                country = int(rng.integers(len(CURRENCIES)))
+                date = datetime(1970, 1, 1) + timedelta(seconds=int(day + hour * 3600))
+                forecast = round(float(rng.normal(0, 1)), 1)
+                rows.append(
+                    [
+                        date.strftime("%Y.%m.%d %H:%M"),
+                        CURRENCIES[country],
+                        IMPACTS[int(rng.integers(len(IMPACTS)))],
+                        EVENTS[int(rng.integers(len(EVENTS)))],
+                        COUNTRIES[country],
+                        round(forecast + float(rng.normal(0, 0.2)), 1),
+                        forecast,
+                        round(float(rng.normal(0, 1)), 1),
+                    ]
+                )
+            day += 86400
+        return encode_reply({"data": rows})
+
+    def symbols(self, request):
+        return encode_reply({"data": SYMBOLS})
+
+    def positions(self, request):
+        return encode_reply({"positions": list(self.open_positions.values())})
+
+    def orders(self, request):
+        return encode_reply({"orders": list(self.open_orders.values())})
+
+    def config(self, request):
+        self.subscriptions.add((request.get("symbol"), request.get("chartTF")))
+        return encode_reply({"error": False, "description": "CONFIG_OK"})
+
+    def trade(self, request):
+        """Keep positions and orders in memory, every change is an event"""
+        actionType = request.get("actionType") or ""
+        ticket = request.get("id")
+        price = self.prices.get(request.get("symbol"), 1.0)
+        # MqlTradeRequest of every change, as the terminal reports them
+        changes = []
+        if actionType in ("ORDER_TYPE_BUY", "ORDER_TYPE_SELL"):
+            ticket = next(self.__tickets)
+            self.open_positions[ticket] = self.__position(ticket, request)
+            changes.append(self.__mql("TRADE_ACTION_DEAL", request, price=price))
+        elif actionType.startswith("ORDER_TYPE_"):
+            ticket = next(self.__tickets)
+            self.open_orders[ticket] = self.__position(ticket, request)
+            changes.append(self.__mql("TRADE_ACTION_PENDING", request))
+        elif actionType == "POSITION_CLOSE_SYMBOL":
+            for position in list(self.open_positions.values()):
+                if position["symbol"] == request.get("symbol"):
+                    del self.open_positions[position["id"]]
+                    changes.append(self.__close(position, position["volume"]))
+        elif actionType in ("POSITION_CLOSE_ID", "POSITION_PARTIAL"):
+            position = self.open_positions.get(ticket)
+            if position is None:
+                return self.__invalid()
+            volume = request.get("volume") or position["volume"]
+            if actionType == "POSITION_CLOSE_ID" or volume >= position["volume"]:
+                volume = position["volume"]
+                del self.open_positions[ticket]
+            else:
+                position["volume"] = round(position["volume"] - volume, 8)
+            changes.append(self.__close(position, volume))
+        elif actionType == "POSITION_MODIFY":
+            position = self.open_positions.get(ticket)
+            if position is None:
+                return self.__invalid()
+            position["stoploss"] = request.get("stoploss")
+            position["takeprofit"] = request.get("takeprofit")
+            changes.append(self.__mql("TRADE_ACTION_SLTP", position, position=ticket))
+        elif actionType == "ORDER_MODIFY":
+            order = self.open_orders.get(ticket)
+            if order is None:
+                return self.__invalid()
+            order["stoploss"] = request.get("stoploss")
+            order["takeprofit"] = request.get("takeprofit")
+            order["open"] = request.get("price") or order["open"]
+            changes.append(
+                self.__mql(
+                    "TRADE_ACTION_MODIFY", order, order=ticket, price=order["open"]
+                )
+            )
+        elif actionType == "ORDER_CANCEL":
+            order = self.open_orders.pop(ticket, None)
+            if order is None:
+                return self.__invalid()
+            changes.append(self.__mql("TRADE_ACTION_REMOVE", order, order=ticket))
+        else:
+            return self.__invalid()
+        result = {
+            "error": False,
+            "retcode": 10009,
+            "description": "TRADE_RETCODE_DONE",
+            "order": ticket,
+            "volume": request.get("volume"),
+            "price": price,
+        }
+        for change in changes:
+            self.__publish_event(
+                change,
+                {
+                    "retcode": 10009,
+                    "result": "TRADE_RETCODE_DONE",
+                    "order": change["order"] or ticket,
+                    "volume": change["volume"],
+                    "price": change["price"] or price,
+                },
+            )
+        return encode_reply(result)
+
+    @staticmethod
+    def __mql(action, fields, **kwargs):
+        """MqlTradeRequest of an action from request or book fields"""
+        mql = {
+            "action": action,
+            "order": 0,
+            "symbol": fields.get("symbol"),
+            "volume": fields.get("volume"),
+            "price": fields.get("price") or fields.get("open"),
+            "sl": fields.get("stoploss"),
+            "tp": fields.get("takeprofit"),
+            "type": fields.get("actionType") or fields.get("type"),
+            "magic": fields.get("magic"),
+            "position": 0,
+            "position_by": 0,
+        }
+        mql.update(kwargs)
+        return mql
+
+    def __close(self, position, volume):
+        opposite = "SELL" if position["type"] == "ORDER_TYPE_BUY" else "BUY"
+        return self.__mql(
+            "TRADE_ACTION_DEAL",
+            position,
+            type=f"ORDER_TYPE_{opposite}",
+            volume=volume,
+            price=self.prices.get(position["symbol"], 1.0),
+            position=position["id"],
+        )
+
+    def __position(self, ticket, request):
+        return {
+            "id": ticket,
+            "magic": request.get("magic"),
+            "symbol": request.get("symbol"),
+            "type": request.get("actionType"),
+            "time_setup": int(time.time()),
+            "open": request.get("price") or self.prices.get(request.get("symbol"), 1.0),
+            "stoploss": request.get("stoploss"),
+            "takeprofit": request.get("takeprofit"),
+            "volume": request.get("volume"),
+        }
+
+    @staticmethod
+    def __invalid():
+        return encode_reply(
+            {"error": True, "retcode": 10013, "description": "TRADE_RETCODE_INVALID"}
+        )
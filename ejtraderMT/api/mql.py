@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from pytz import timezone
 from tzlocal import get_localzone
 from queue import Queue
-from threading import Thread
+from concurrent.futures import Future
 import os
 import time
 import zmq
@@ -12,6 +12,36 @@ from ejtraderTH import start
 from ejtraderDB import DictSQLite
 from influxdb import DataFrameClient
 from tqdm import tqdm
+from .pool import SocketPool, TerminalPool, parse_endpoints
+from .history import (
+    AdaptiveChunker,
+    HistoryEngine,
+    IncompleteHistory,
+    TIMEFRAMES,
+    merge_ranges,
+    missing_ranges,
+)
+from .decoder import HistoryDecoder, align
+from .wire import decode_reply
+from .store import BarStore
+from .ticks import TickArchive, TickRecorder
+from .resample import resample
+from .stream import (
+    Callback,
+    Events,
+    PriceStream,
+    Subscriptions,
+    TickCache,
+    to_frame,
+)
+from .bars import BarBuilder
+from .metrics import Metrics
+from .retry import Backlog, RetryPolicy
+from .clock import BrokerClock
+from .calendar_store import CalendarStore, calendar_frame
+from .symbols import SymbolRegistry
+from .account import AccountMirror
+from .parallel import ChunkPool
 import logging
 import sys
 import warnings
@@ -30,24 +60,49 @@ LOGGER = {
     "stream": sys.stdout,
 }
 
+# days of economic calendar asked in one request
+CALENDAR_SPAN = 31 * 86400
+# seconds of ticks archive() appends at a time
+ARCHIVE_SPAN = 30 * 86400
+
 
 class Functions:
-    def __init__(self, host=None, debug=None):
+    def __init__(
+        self,
+        host=None,
+        debug=None,
+        context=None,
+        encoding=None,
+        metrics=None,
+        timeout=None,
+        retry=None,
+        port=None,
+        backlog=None,
+    ):
         self.HOST = host or "localhost"
-        self.SYS_PORT = 15557  # REP/REQ port
-
-        # ZeroMQ timeout in seconds
-        sys_timeout = 1000
+        self.SYS_PORT = port or 15557  # REP/REQ port
+        self.LIVE_PORT = self.SYS_PORT - 1  # PUSH/PULL port prices
+        self.EVENTS_PORT = self.SYS_PORT + 1  # PUSH/PULL port events
+        # JSON or binary payloads for HISTORY replies
+        self.encoding = encoding or "json"
+        # Metrics collecting command timings, None disables them
+        self.metrics = metrics
+        # resend policy for commands that timed out
+        self.retry = retry or RetryPolicy()
+
+        # ZeroMQ timeout in milliseconds
+        self.timeout = timeout or 1000
+        # requests in flight to this terminal, shared by its connections
+        self.backlog = backlog or Backlog()
 
         # initialise ZMQ context
-        context = zmq.Context()
+        # shared context, a per-connection one blocks in term() when collected
+        context = context or zmq.Context.instance()
+        self.context = context
 
         # connect to server sockets
         try:
-            self.sys_socket = context.socket(zmq.REQ)
-            # set port timeout
-            self.sys_socket.RCVTIMEO = sys_timeout
-            self.sys_socket.connect("tcp://{}:{}".format(self.HOST, self.SYS_PORT))
+            self.sys_socket = self.__connect()
 
         except zmq.ZMQError:
             raise zmq.ZMQBindError("Binding ports ERROR")
@@ -56,6 +111,41 @@ class Functions:
             self.sys_socket.term()
             pass
 
+    def __connect(self):
+        socket = self.context.socket(zmq.REQ)
+        # set port timeout
+        socket.RCVTIMEO = self.timeout
+        socket.LINGER = 0
+        socket.connect("tcp://{}:{}".format(self.HOST, self.SYS_PORT))
+        return socket
+
+    def _reconnect(self):
+        """Replace the REQ socket, after a missed reply it refuses to send again"""
+        self.sys_socket.close()
+        self.sys_socket = self.__connect()
+
+    def close(self):
+        """Close the REQ socket"""
+        self.sys_socket.close()
+
+    def live_socket(self):
+        """Connect a PULL socket to the live prices port"""
+        try:
+            socket = self.context.socket(zmq.PULL)
+            socket.connect("tcp://{}:{}".format(self.HOST, self.LIVE_PORT))
+        except zmq.ZMQError:
+            raise zmq.ZMQBindError("Live port connection ERROR")
+        return socket
+
+    def streaming_socket(self):
+        """Connect a PULL socket to the events port"""
+        try:
+            socket = self.context.socket(zmq.PULL)
+            socket.connect("tcp://{}:{}".format(self.HOST, self.EVENTS_PORT))
+        except zmq.ZMQError:
+            raise zmq.ZMQBindError("Events port connection ERROR")
+        return socket
+
     def _send_request(self, data: dict) -> None:
         """Send request to server via ZeroMQ System socket"""
         try:
@@ -65,16 +155,20 @@ class Functions:
         except zmq.ZMQError:
             raise zmq.NotDone("Sending request ERROR")
 
-    def _pull_reply(self):
-        """Get reply from server via Data socket with timeout"""
+    def _pull_frames(self):
+        """Get the reply frames from server via Data socket with timeout"""
         try:
-            msg = self.sys_socket.recv_json()
+            return self.sys_socket.recv_multipart()
         except zmq.ZMQError:
             raise zmq.NotDone("Data socket timeout ERROR")
-        return msg
 
-    def Command(self, **kwargs) -> dict:
-        """Construct a request dictionary from default and send it to server"""
+    def _pull_reply(self):
+        """Get reply from server via Data socket with timeout"""
+        return decode_reply(self._pull_frames())
+
+    @staticmethod
+    def _request(**kwargs) -> dict:
+        """Construct a request dictionary from default"""
 
         # default dictionary
         request = {
@@ -105,12 +199,80 @@ class Functions:
                 request[key] = value
             else:
                 raise KeyError("Unknown key in **kwargs ERROR")
+        return request
 
-        # send dict to server
-        self._send_request(request)
-
-        # return server reply
-        return self._pull_reply()
+    def Command(self, **kwargs) -> dict:
+        """Construct a request dictionary from default and send it to server"""
+        return self.__send(self._request(**kwargs), decode=True)
+
+    def Frames(self, **kwargs) -> list:
+        """Like Command but return the raw reply frames to be decoded elsewhere"""
+        return self.__send(self._request(**kwargs), decode=False)
+
+    def __send(self, request, decode):
+        # ask for binary data, servers that only speak JSON ignore it
+        if self.encoding == "binary" and request["action"] == "HISTORY":
+            request["encoding"] = "binary"
+
+        for attempt in range(self.retry.attempts):
+            if attempt:
+                time.sleep(self.retry.delay(attempt))
+                logging.info(f"Retrying {request['action']} after a timeout")
+                if self.metrics is not None:
+                    self.metrics.count(
+                        request["action"], request["actionType"], "retries"
+                    )
+            # the EA serves one request at a time, wait for the ones ahead too
+            depth = self.backlog.enter()
+            self.sys_socket.RCVTIMEO = self.timeout * depth
+            pause = 0
+            try:
+                if self.metrics is None:
+                    # send dict to server
+                    self._send_request(request)
+
+                    # return server reply
+                    if not decode:
+                        return self._pull_frames()
+                    return self._pull_reply()
+                return self.__timed(request, decode)
+            except zmq.NotDone:
+                # the EA still has it queued, give it that long before sending more
+                pause = self.timeout * depth / 1000
+                # lazy pirate: drop the stuck socket and connect a new one
+                self._reconnect()
+                last = attempt + 1 == self.retry.attempts
+                if last or not self.retry.retryable(request):
+                    raise
+            finally:
+                self.backlog.leave(pause)
+
+    def __timed(self, request, decode=True):
+        """Command round trip recording each phase in self.metrics"""
+        action = request["action"]
+        actionType = request["actionType"]
+        start = time.perf_counter()
+        try:
+            self._send_request(request)
+            sent = time.perf_counter()
+            frames = self._pull_frames()
+        except zmq.NotDone:
+            self.metrics.count(action, actionType, "timeouts")
+            raise
+        received = time.perf_counter()
+        self.metrics.observe(action, actionType, "send", sent - start)
+        self.metrics.observe(action, actionType, "wait", received - sent)
+        if not decode:
+            # decoded by the caller, elsewhere
+            self.metrics.observe(action, actionType, "total", received - start)
+            return frames
+        reply = decode_reply(frames)
+        done = time.perf_counter()
+        if isinstance(reply, dict) and reply.get("error"):
+            self.metrics.count(action, actionType, "errors")
+        self.metrics.observe(action, actionType, "decode", done - received)
+        self.metrics.observe(action, actionType, "total", done - start)
+        return reply
 
 
 class Metatrader:
@@ -126,18 +288,82 @@ class Metatrader:
         dbuser=None,
         dbname=None,
         debug=False,
+        workers=None,
+        encoding=None,
+        dbpath=None,
+        timeout=None,
+        retry=None,
+        processes=None,
+        backlog=None,
     ):
         if debug:
             logging.basicConfig(**LOGGER)
 
-        self.__api = Functions(host, debug=debug)
+        # timings of every command, see metrics.summary() and metrics.prometheus()
+        self.metrics = Metrics()
+        # command timeout in seconds, history windows are sized to stay under it
+        self.__timeout = (timeout or 1000) / 1000
+        # host is one terminal or a list, "host" or "host:port" with the REQ port
+        endpoints = parse_endpoints(host)
+        context = zmq.Context.instance()
+        # one queue per terminal shared by every connection to it, at most
+        # backlog requests in flight on each terminal
+        backlogs = {}
+
+        def connect(host, port):
+            return Functions(
+                host,
+                debug=debug,
+                context=context,
+                encoding=encoding,
+                metrics=self.metrics,
+                timeout=timeout,
+                retry=retry,
+                port=port,
+                backlog=backlogs.setdefault((host, port), Backlog(backlog or 2)),
+            )
+
+        # REQ sockets to every terminal, history chunks are spread over all of
+        # them and live symbols are sharded between them
+        self.__pool = TerminalPool(endpoints, connect, size=workers or 4)
+        # REQ sockets to the first terminal only, for trade bursts and the
+        # account mirror: tickets only mean something on the terminal that
+        # issued them
+        self.__trades = SocketPool(lambda: connect(*endpoints[0]), size=workers or 4)
+        # account and trade commands go to the first terminal
+        self.__api = connect(*endpoints[0])
+        self.__pool.watch(self.__failover)
+        # history replies decoded on this many processes, None keeps them on threads
+        self.__chunks = ChunkPool(processes) if processes else None
         self.real_volume = real_volume or False
+        # live socket and reader thread shared by price() and stream()
+        self.__subscriptions = None
+        self.__price_stream = None
+        self.__price_config = None
+        self.__event_config = None
+        self.__event_stream = None
+        self.__events = None
+        self.__mirror = None
+        self.__mirror_events = None
         self.__tz_local = tz_local
         self.__utc_timezone = timezone("UTC")
         self.__my_timezone = get_localzone()
-        self.__utc_brocker_offset = self.___utc_brocker_offset()
+        # symbol list cached on disk per terminal and refreshed once a day
+        server = "{}:{}".format(*endpoints[0])
+        self.registry = SymbolRegistry(
+            lambda: self.__api.Command(action="LISTSYMBOLS"),
+            path=os.path.join("DataBase", "symbols_{}_{}.json".format(*endpoints[0])),
+            server=server,
+        )
+        # economic calendar events cached per day
+        self.__calendar = CalendarStore()
+        # broker time served locally, measured on first use and refreshed
+        self.clock = BrokerClock(self.accountInfo)
         # db settings
-        self.dbtype = dbtype or "SQLITE"  # SQLITE OR INFLUXDB
+        self.dbtype = dbtype or "SQLITE"  # SQLITE, BARSTORE OR INFLUXDB
+        if self.dbtype == "BARSTORE":
+            # partitioned files per symbol, timeframe and month or day
+            self.__store = BarStore(dbpath or "DataBase/store")
         if self.dbtype == "INFLUXDB":
             warnings.warn(
                 "INFLUXDB will be removed in future versions.", DeprecationWarning
@@ -157,123 +383,100 @@ class Metatrader:
     def balance(self):
         return self.__api.Command(action="BALANCE")
 
-    def symbols(self):
-        df = None
+    def symbols(self, type=None):
+        """Symbols listed by the broker, from the local registry"""
         try:
-            df = self.__api.Command(action="LISTSYMBOLS")
-
+            if type is not None:
+                return self.registry.frame(self.registry.filter(type=type))
+            return self.registry.frame()
         except Exception as e:
             logging.info(f"Error while processing. Error message: {str(e)}")
 
-        if df is not None and isinstance(df, dict):
-            try:
-                if df["data"]:
-                    df = pd.DataFrame(df["data"])
-                    df.columns = [
-                        "symbol",
-                        "expiration",
-                        "type",
-                    ]
-            except Exception as e:
-                logging.info(
-                    f"Error while processing Dataframe. Error message: {str(e)}"
-                )
-                pass
-        df = df.drop_duplicates(subset="symbol", keep="first")
-
-        return df
+    def calendar(
+        self,
+        symbol=None,
+        fromDate=None,
+        toDate=None,
+        database=None,
+        currency=None,
+        impact=None,
+    ):
+        """Economic calendar events, only the days not cached yet are downloaded
 
-    def calendar(self, symbol=None, fromDate=None, toDate=None, database=None):
+        Consecutive missing days are fetched a month per request and kept in a
+        local store that serves repeated queries. currency and impact filter the events, each a
+        value or a list.
+        """
         self._symbol = symbol
-        self._fromDate = fromDate
-        self._toDate = toDate
-        self.__calendarQ = Queue()
-        self.__database = database
-        try:
-            start(self._calendar, repeat=1, max_threads=20)
-        except Exception as e:
-            logging.info(f"Error: {e}")
-
-        return self.__calendarQ.get()
-
-    def _calendar(self, data):
-        symbol = self._symbol
-        fromDate = self._fromDate
-        toDate = self._toDate
-        df = pd.DataFrame()
-        # count data
-        if not isinstance(fromDate, int):
-            start_date = datetime.strptime(fromDate, "%d/%m/%Y")
-        else:
-            start_date = self.__brokerTimeDelta(fromDate)
-        if not toDate:
-            end_date = self.__brokerTimeDelta(0)
-        else:
-            end_date = datetime.strptime(toDate, "%d/%m/%Y")
-
-        delta = timedelta(days=1)
-        delta2 = timedelta(days=1)
-        diff_days = start_date - end_date
-        days_count = diff_days.days
-        pbar = tqdm(total=abs(days_count))
-        appended_data = []
-        while start_date <= end_date:
-            pbar.update(delta.days)
-            fromDate = start_date.strftime("%d/%m/%Y")
-            toDate = start_date
-            toDate += delta2
-            toDate = toDate.strftime("%d/%m/%Y")
-
-            try:
-                df = self.__api.Command(
-                    action="CALENDAR",
-                    actionType="DATA",
-                    symbol=symbol,
-                    fromDate=self.__date_to_timestamp(fromDate),
-                    toDate=self.__date_to_timestamp(toDate),
-                )
-            except Exception as e:
-                logging.info(
-                    f"Error while processing {symbol}. Error message: {str(e)}"
-                )
-                pass
-
+        start_date, end_date = self.__date_range(fromDate, toDate)
+        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        broker_now = self.__brokerTimeDelta(0)
+        windows = []
+        complete = set()
+        for begin, end in HistoryEngine.chunks(start_date, end_date):
+            window = (
+                self.__date_to_timestamp(begin.strftime("%d/%m/%Y")),
+                self.__date_to_timestamp(end.strftime("%d/%m/%Y")),
+            )
+            windows.append(window)
+            # events of the day still running get their actual values later
+            if end <= broker_now:
+                complete.add(window)
+
+        # consecutive missing days are asked together, a month per request,
+        # apart from the day still running
+        missing = missing_ranges(windows, self.__calendar.ranges(symbol))
+        running = [window for window in missing if window not in complete]
+        gaps = merge_ranges([window for window in missing if window in complete])
+        requests = [
+            dict(
+                action="CALENDAR",
+                actionType="DATA",
+                symbol=symbol,
+                fromDate=since,
+                toDate=min(since + CALENDAR_SPAN, end),
+            )
+            for begin, end in gaps + running
+            for since in range(int(begin), int(end), CALENDAR_SPAN)
+        ]
+        frames = []
+        fetched = []
+        failure = None
+        if requests:
+            pbar = tqdm(total=len(requests))
             try:
-                df = pd.DataFrame(df["data"])
-                df.columns = [
-                    "date",
-                    "currency",
-                    "impact",
-                    "event",
-                    "country",
-                    "actual",
-                    "forecast",
-                    "previous",
-                ]
-                df["date"] = pd.to_datetime(df["date"], errors="coerce")
-                df = df.dropna(subset=["date"])
-                df = df.set_index("date")
-                df.index = pd.to_datetime(df.index)
-            except Exception as e:
-                logging.info(
-                    f"Error while processing {symbol} Dataframe. Error message: {str(e)}"
-                )
-                pass
-
-            appended_data.append(df)
-            start_date += delta
-        pbar.close()
-
-        df = pd.concat(appended_data)
-
-        if self.__database:
-            start(self.__save_to_db, data=[df], repeat=1, max_threads=20)
+                replies = HistoryEngine(self.__pool).fetch(requests, pbar=pbar)
+            except IncompleteHistory as e:
+                # keep the days that came back, the others are asked again next time
+                failure, replies = e, e.replies
+            pbar.close()
+            for request, data in zip(requests, replies):
+                if data is None or not isinstance(data, dict):
+                    continue
+                try:
+                    frames.append(calendar_frame(data["data"]))
+                except Exception as e:
+                    logging.info(
+                        f"Error while processing {symbol} Dataframe. Error message: {str(e)}"
+                    )
+                    continue
+                window = (request["fromDate"], request["toDate"])
+                if window not in running:
+                    fetched.append(window)
+        if frames:
+            self.__calendar.write(symbol, pd.concat(frames))
+        self.__calendar.add_ranges(symbol, fetched)
+        if failure is not None:
+            raise failure
+
+        df = self.__calendar.query(
+            symbol, start_date, end_date + timedelta(days=1), currency, impact
+        )
+        if database:
+            self.__save_to_db(df)
         else:
-            try:
-                self.__set_utc_or_localtime_tz_df(df)
-                self.__calendarQ.put(df)
-            except AttributeError:
-                pass
+            self.__set_utc_or_localtime_tz_df(df)
+        return df
 
     def accountInfo(self):
         return self.__api.Command(action="ACCOUNT")
@@ -344,7 +547,7 @@ class Metatrader:
     def sellStop(self, symbol, volume, stoploss, takeprofit, price=0, deviation=5):
         self.trade(
             symbol,
-            "ORDER_TYPE_SELL_LIMIT",
+            "ORDER_TYPE_SELL_STOP",
             volume,
             stoploss,
             takeprofit,
@@ -352,19 +555,64 @@ class Metatrader:
             deviation,
         )
 
+    def batch(self, actions):
+        """Send a list of trade actions in one burst, one reply per action
+
+        Each action is a dict of Command arguments, action defaults to TRADE:
+        {"actionType": "ORDER_TYPE_BUY", "symbol": "EURUSD", "volume": 0.01}.
+        Actions go out concurrently to the first terminal and are never retried,
+        a failed one comes back as {"error": True, "description": ...}.
+        """
+        return self.__trades.burst([dict({"action": "TRADE"}, **a) for a in actions])
+
+    def mirror(self, reconcile=60, settle=1.0):
+        """Positions, orders and account kept in process from the trade events
+
+        Reads on the returned AccountMirror are local, it reconciles with the
+        terminal every `reconcile` seconds and `settle` seconds after trades.
+        """
+        if self.__mirror is None:
+
+            def command(**kwargs):
+                # a connection of its own to the trading terminal, the
+                # caller's socket is not thread safe
+                with self.__trades.connection() as api:
+                    return api.Command(**kwargs)
+
+            mirror = AccountMirror(command, reconcile=reconcile, settle=settle)
+            self.__mirror_events = self.events(callback=mirror.apply)
+            self.__mirror = mirror.start()
+        return self.__mirror
+
     def cancel_all(self):
-        orders = self.orders()
+        # the mirror already knows the book, it only asks the terminal when
+        # trades happened since its last reconciliation
+        if self.__mirror is not None:
+            orders = {"orders": self.__mirror.current().orders()}
+        else:
+            orders = self.orders()
 
         if "orders" in orders:
-            for order in orders["orders"]:
-                self.CancelById(order["id"])
+            return self.batch(
+                [
+                    {"actionType": "ORDER_CANCEL", "id": order["id"]}
+                    for order in orders["orders"]
+                ]
+            )
 
     def close_all(self):
-        positions = self.positions()
+        if self.__mirror is not None:
+            positions = {"positions": self.__mirror.current().positions()}
+        else:
+            positions = self.positions()
 
         if "positions" in positions:
-            for position in positions["positions"]:
-                self.CloseById(position["id"])
+            return self.batch(
+                [
+                    {"actionType": "POSITION_CLOSE_ID", "id": position["id"]}
+                    for position in positions["positions"]
+                ]
+            )
 
     def positionModify(self, id, stoploss, takeprofit):
         self.__api.Command(
@@ -401,89 +649,138 @@ class Metatrader:
     def CancelById(self, id):
         self.__api.Command(action="TRADE", actionType="ORDER_CANCEL", id=id)
 
-    def ___utc_brocker_offset(self):
-        utc = datetime.now(self.__utc_timezone).strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            broker = self.accountInfo()
-            broker = datetime.strptime(broker["time"], "%Y.%m.%d %H:%M:%S")
-        except KeyError:
-            raise "Metatrader 5 Server is disconnect"
-        utc = datetime.strptime(utc, "%Y-%m-%d %H:%M:%S")
-
-        duration = broker - utc
-        duration_in_s = duration.total_seconds()
-        hour = divmod(duration_in_s, 60)[0]
-        seconds = int(hour) * 60
-        return seconds
-
-    def _price(self):
-        connect = self.__api.live_socket()
-        while True:
-            price = connect.recv_json()
-            try:
-                price = price["data"]
-                price = pd.DataFrame([price])
-                price = price.set_index([0])
-                price.index.name = "date"
-                if self._allchartTF == "TICK":
-                    price.index = pd.to_datetime(price.index, unit="ms")
-                    price.columns = ["bid", "ask"]
-                    self.__priceQ.put(price)
-                elif self._allchartTF == "TS":
-                    price.index = pd.to_datetime(price.index, unit="ms")
-                    price.columns = ["type", "bid", "ask", "last", "volume"]
-                    self.__priceQ.put(price)
-                else:
-                    if self.real_volume:
-                        del price[5]
-                    else:
-                        del price[6]
-                    price.index = pd.to_datetime(price.index, unit="s")
-                    price.columns = ["open", "high", "low", "close", "volume", "spread"]
-                    self.__priceQ.put(price)
-
-            except KeyError:
-                pass
-
-    def _start_thread_price(self):
-        t = Thread(target=self._price, daemon=True)
-        t.start()
-        self.__priceQ = Queue()
+    @property
+    def terminals(self):
+        """The pool of terminals, see terminals.check() and terminals.healthy()"""
+        return self.__pool
+
+    @property
+    def subscriptions(self):
+        """Subscriptions on the live socket, created on first use"""
+        if self.__subscriptions is None:
+            self.__subscriptions = Subscriptions(
+                self.__pool.sockets("live"),
+                configure=self.__configure,
+                real_volume=self.real_volume,
+            )
+        return self.__subscriptions
 
-    def _start_thread_event(self):
-        t = Thread(target=self._event, daemon=True)
-        t.start()
-        self.__eventQ = Queue()
+    def __configure(self, symbol, chartTF):
+        # each symbol is streamed by one terminal only, the socket reads them all
+        return self.__pool.command(
+            symbol, action="CONFIG", symbol=symbol, chartTF=chartTF
+        )
 
-    def _event(self):
-        connect = self.__api.streaming_socket()
-        while True:
-            event = connect.recv_json()
-            try:
-                event = event["request"]
-                event = pd.DataFrame(event, index=[0])
-                self.__eventQ.put(event)
-            except KeyError:
-                pass
+    def __failover(self, terminal, symbols):
+        """Subscribe the symbols of a terminal that went down on the others"""
+        symbols = set(symbols)
+        pairs = set()
+        if self.__subscriptions is not None:
+            pairs.update(self.__subscriptions.pairs())
+        if self.__event_config is not None:
+            pairs.update((s, self.__event_config[1]) for s in self.__event_config[0])
+        for symbol, chartTF in pairs:
+            if symbol in symbols:
+                logging.info(f"Subscribing {symbol} {chartTF} on another terminal")
+                self.__configure(symbol, chartTF)
 
     def price(self, symbol, chartTF):
         self._allsymbol_ = symbol
         self._allchartTF = chartTF
-        for active in symbol:
-            self.__api.Command(action="CONFIG", symbol=active, chartTF=chartTF)
-        self._start_thread_price()
-        time.sleep(0.5)
-        return self.__priceQ.get()
+        stream = self.__price_stream
+        # repeated calls read the same subscription instead of a new thread
+        if stream is None or self.__price_config != (tuple(symbol), chartTF):
+            if stream is not None:
+                stream.close()
+            self.__price_config = (tuple(symbol), chartTF)
+            # conflated, a polling loop always reads the latest quote
+            stream = self.__price_stream = self.subscriptions.add(
+                symbol,
+                PriceStream(
+                    chartTF, subscriptions=self.subscriptions, policy="conflate"
+                ),
+            )
+        price = to_frame([stream.get()])
+        del price["symbol"]
+        return price
+
+    def stream(
+        self,
+        symbol,
+        chartTF,
+        maxsize=100000,
+        cache=None,
+        bars=None,
+        callback=None,
+        policy="drop",
+    ):
+        """Live prices as lightweight records, DataFrames only on demand
+
+        stream.get() returns one Tick, Trade or Bar record, stream.frame()
+        drains everything buffered into one DataFrame, `async for` and
+        `await stream.aget()` read it from asyncio. cache=N keeps the last N
+        records per symbol in stream.cache for rolling windows. bars=["M1", "H1"]
+        builds candles from TICK or TS in stream.bars. With callback every
+        record is passed to it on the subscriber's own thread. policy is the
+        backpressure for slow consumers: "drop" oldest, "conflate" to the latest
+        record per symbol or "block" the reader. Every stream shares one socket
+        and one reader thread, close() ends it.
+        """
+        if callback is not None:
+            subscriber = Callback(
+                chartTF,
+                callback,
+                maxsize=maxsize,
+                subscriptions=self.subscriptions,
+                policy=policy,
+            )
+        else:
+            subscriber = PriceStream(
+                chartTF,
+                maxsize=maxsize,
+                cache=TickCache(cache) if cache else None,
+                bars=BarBuilder(bars) if bars else None,
+                subscriptions=self.subscriptions,
+                policy=policy,
+            )
+        return self.subscriptions.add(symbol, subscriber)
+
+    def events(
+        self, symbol=None, chartTF=None, maxsize=100000, callback=None, policy="drop"
+    ):
+        """Trade events as dicts, read like stream() or passed to callback"""
+        if self.__events is None:
+            self.__events = Events(self.__pool.sockets("events"))
+        if symbol is not None:
+            self.__event_configure(symbol, chartTF)
+        if callback is not None:
+            subscriber = Callback(
+                None,
+                callback,
+                maxsize=maxsize,
+                subscriptions=self.__events,
+                policy=policy,
+            )
+        else:
+            subscriber = PriceStream(
+                None, maxsize=maxsize, subscriptions=self.__events, policy=policy
+            )
+        return self.__events.add(None, subscriber)
 
     def event(self, symbol, chartTF):
         self._allsymbol_ = symbol
         self._allchartTF = chartTF
-        for active in symbol:
-            self.__api.Command(action="CONFIG", symbol=active, chartTF=chartTF)
+        if self.__event_stream is None:
+            self.__event_stream = self.events(symbol, chartTF)
+        else:
+            self.__event_configure(symbol, chartTF)
+        return to_frame([self.__event_stream.get()])
 
-        self._start_thread_event()
-        time.sleep(0.5)
-        return self.__eventQ.get()
+    def __event_configure(self, symbol, chartTF):
+        if self.__event_config != (tuple(symbol), chartTF):
+            self.__event_config = (tuple(symbol), chartTF)
+            for active in symbol:
+                self.__configure(active, chartTF)
 
     # convert datestamp to dia/mes/ano
     def __date_to_timestamp(self, s):
@@ -494,40 +791,17 @@ class Metatrader:
         return time.mktime(s.timetuple())
 
     def ___date_to_timestamp_broker(self):
-        brokertime = time.mktime(
-            datetime.strptime(
-                self.accountInfo()["time"], "%Y.%m.%d %H:%M:%S"
-            ).timetuple()
-        )
-        return brokertime
+        return time.mktime(self.clock.now().timetuple())
 
     def __brokerTimeDelta(self, m):
-        delta = timedelta(days=m)
-        broker = datetime.strptime(self.accountInfo()["time"], "%Y.%m.%d %H:%M:%S")
-        result = broker - delta
-        return result
+        return self.clock.now() - timedelta(days=m)
 
     def __timeframe_to_sec(self, timeframe):
-        # Timeframe dictionary
-        TIMECANDLE = {
-            "M1": 60,
-            "M2": 120,
-            "M3": 180,
-            "M4": 240,
-            "M5": 300,
-            "M15": 900,
-            "M30": 1800,
-            "H1": 3600,
-            "H4": 14400,
-            "D1": 86400,
-            "W1": 604800,
-            "MN": 2629746,
-        }
-        return TIMECANDLE[timeframe]
+        return TIMEFRAMES[timeframe]
 
     def __set_utc_or_localtime_tz_df(self, df):
         try:
-            df.index = df.index.tz_localize(self.__utc_brocker_offset)
+            df.index = df.index.tz_localize(self.clock.utc_offset)
             if self.__tz_local:
                 df.index = df.index.tz_convert(self.__my_timezone)
             df.index = df.index.tz_localize(None)
@@ -543,8 +817,14 @@ class Metatrader:
         toDate=None,
         database=None,
         dataframe=True,
+        how="inner",
+        rows=50000,
     ):
         self.chartTF = chartTF
+        # target rows per HISTORY request
+        self.rows = rows
+        # how symbols in a list are joined: inner, outer or asof
+        self.how = how
         self.__database = database
         self.fromDate = fromDate
         self.toDate = toDate
@@ -560,245 +840,498 @@ class Metatrader:
             self.__symbol = [symbol]
 
         if chartTF:
-            if self.__database:
-                try:
-                    start(self.__historyThread_save, repeat=1, max_threads=20)
-                except Exception as e:
-                    logging.info(
-                        f"Error: unable to start History thread Error message: {str(e)}"
-                    )
-            else:
-                try:
-                    start(self.__historyThread_save, repeat=1, max_threads=20)
-                except Exception as e:
-                    logging.info(
-                        f"Error: unable to start History thread Error message: {str(e)}"
-                    )
-
-                return self.__historyQ.get()
+            try:
+                start(self.__historyThread_save, repeat=1, max_threads=20)
+            except Exception as e:
+                logging.info(
+                    f"Error: unable to start History thread Error message: {str(e)}"
+                )
+            df = self.__historyQ.get()
+            # a chunk without reply would leave a gap, raise instead
+            if isinstance(df, Exception):
+                raise df
+            if not self.__database:
+                return df
+        elif self.dbtype == "BARSTORE":
+            timeframes = self.__store.timeframes(self.__symbol[0])
+            if not timeframes:
+                return f" {self.__symbol[0]}  isn't on database"
+            return self.load(self.__symbol[0], timeframes[0], fromDate, toDate)
         else:
+            # bars are stored under {symbol}_{chartTF}, the first timeframe found
+            active = self.__symbol[0]
             q = DictSQLite("history")
-            if isinstance(symbol, list):
+            df = f" {active}  isn't on database"
+            for timeframe in list(TIMEFRAMES) + ["TICK", "TS"]:
+                key = self.__key(active, timeframe)
                 try:
                     if self.dbtype == "SQLITE":
-                        df = q[f"{self.__symbol[0]}"]
+                        df = q[key]
                     else:
-                        df = self.__client.query(f"select * from {self.__symbol[0]}")
-                        df = df[self.__symbol[0]]
+                        df = self.__client.query(f"select * from {key}")
+                        df = df[key]
 
                         df.index.name = "date"
+                    break
                 except KeyError:
-                    df = f" {self.__symbol[0]}  isn't on database"
                     pass
+            return df
+
+    def load(self, symbol, chartTF, fromDate=None, toDate=None):
+        """Read a date range from the BARSTORE database without loading the rest"""
+        df = self.__store.read(symbol, chartTF, fromDate, toDate)
+        if df is None:
+            return f" {symbol}  isn't on database"
+        return df
+
+    def resample(
+        self,
+        data,
+        chartTF,
+        fromDate=None,
+        toDate=None,
+        source="M1",
+        utc=False,
+        point=None,
+    ):
+        """Build higher timeframes locally from stored M1 bars or ticks
+
+        data is a DataFrame or a symbol read from the database (source="M1") or
+        from its tick archive (source="TICK"). chartTF can be a list.
+        """
+        if isinstance(data, pd.DataFrame):
+            df = data
+        elif source == "TICK":
+            if isinstance(fromDate, str):
+                fromDate = datetime.strptime(fromDate, "%d/%m/%Y")
+            if isinstance(toDate, str):
+                toDate = datetime.strptime(toDate, "%d/%m/%Y") + timedelta(days=1)
+            df = self.ticks(data).frame(fromDate, toDate)
+        elif self.dbtype == "BARSTORE":
+            df = self.__store.read(data, source, fromDate, toDate)
+        else:
+            try:
+                df = DictSQLite("history")[self.__key(data, source)]
+            except KeyError:
+                df = None
+            # without fromDate from the first stored bar, toDate is a whole day
+            if df is not None and fromDate is not None:
+                df = df.loc[self.__date_range(fromDate, None)[0] :]
+            if df is not None and toDate:
+                end = datetime.strptime(toDate, "%d/%m/%Y") + timedelta(days=1)
+                df = df[df.index < end]
+        if df is None:
+            return f" {data}  isn't on database"
+
+        # candles follow broker midnight, bars from MT5 are already broker time
+        offset = self.clock.utc_offset if utc else 0
+        if isinstance(chartTF, list):
+            return {tf: resample(df, tf, offset=offset, point=point) for tf in chartTF}
+        return resample(df, chartTF, offset=offset, point=point)
+
+    def sync(self, symbol, chartTF, fromDate, toDate=None, rows=50000):
+        """Download only the ranges missing from the database and append them
+
+        Consecutive missing days are fetched as one range in adaptive windows
+        of about rows bars, like history().
+        """
+        actives = symbol if isinstance(symbol, list) else [symbol]
+        start_date, end_date = self.__date_range(fromDate, toDate)
+        windows = [
+            (
+                self.__date_to_timestamp(begin.strftime("%d/%m/%Y")),
+                self.__date_to_timestamp(end.strftime("%d/%m/%Y")),
+            )
+            for begin, end in HistoryEngine.chunks(start_date, end_date)
+        ]
+
+        q = DictSQLite("history", multithreading=True)
+        chunkers = {}
+        for active in actives:
+            if self.dbtype == "BARSTORE":
+                covered = self.__store.ranges(active, chartTF)
             else:
                 try:
-                    if self.dbtype == "SQLITE":
-                        df = q[f"{self.__symbol}"]
-                    else:
-                        df = self.__client.query(f"select * from {self.__symbol}")
-                        df = df[self.__symbol]
-
-                        df.index.name = "date"
+                    covered = q[f"{self.__key(active, chartTF)}_ranges"]
                 except KeyError:
-                    df = f" {self.__symbol}  isn't on database"
-                    pass
-            return df
+                    covered = []
+            gaps = merge_ranges(missing_ranges(windows, covered))
+            for index, (begin, end) in enumerate(gaps):
+                chunkers[(active, index)] = AdaptiveChunker(
+                    begin, end, chartTF, rows=rows, latency=self.__timeout / 2
+                )
+
+        def request(key, fromDate, toDate):
+            return dict(
+                action="HISTORY",
+                actionType="DATA",
+                symbol=key[0],
+                chartTF=chartTF,
+                fromDate=fromDate,
+                toDate=toDate,
+            )
+
+        days = sum(chunker.end - chunker.begin for chunker in chunkers.values())
+        pbar = tqdm(total=round(days / 86400))
+        failure = None
+        try:
+            replies = HistoryEngine(self.__pool).fetch_adaptive(
+                chunkers, request, pbar, decode=self.__decode(chartTF)
+            )
+        except IncompleteHistory as e:
+            # store what came back, the failed windows stay missing for next sync
+            failure, replies = e, e.replies
+        finally:
+            pbar.close()
+
+        # the day still running is fetched again on the next sync
+        now = self.datetime_to_timestamp(self.__brokerTimeDelta(0))
+        decoders = {
+            active: HistoryDecoder(chartTF, real_volume=self.real_volume)
+            for active in actives
+        }
+        fetched = {active: [] for active in actives}
+        for (active, _), results in replies.items():
+            for window, data in results:
+                if data is None or not isinstance(data, (dict, Future)):
+                    continue
+                try:
+                    self.__append(decoders[active], data)
+                except Exception as e:
+                    logging.info(
+                        f"Error while processing Dataframe {active}. Error message: {str(e)}"
+                    )
+                    continue
+                if window[1] <= now:
+                    fetched[active].append(window)
+
+        frames = {}
+        for active in actives:
+            df = None
+            if len(decoders[active]):
+                df = self.__set_utc_or_localtime_tz_df(decoders[active].frame())
+            frames[active] = self.__store_history(active, chartTF, df, fetched[active])
+            if self.dbtype == "BARSTORE":
+                frames[active] = self.__store.read(
+                    active,
+                    chartTF,
+                    start_date.replace(hour=0, minute=0, second=0, microsecond=0),
+                    end_date + timedelta(days=1),
+                )
+
+        if failure is not None:
+            raise failure
+        if isinstance(symbol, list):
+            return frames
+        return frames[symbol]
+
+    def archive(self, symbol, fromDate, toDate=None, path="DataBase/ticks", rows=50000):
+        """Append TICK history to the symbol archive, resuming after the last tick
+
+        Each month is fetched in adaptive windows of about rows ticks.
+        """
+        archive = TickArchive(os.path.join(path, f"{symbol}.ticks"))
+        start_date, end_date = self.__date_range(fromDate, toDate)
+        if archive.last is not None:
+            last = datetime(1970, 1, 1) + timedelta(milliseconds=archive.last)
+            start_date = max(start_date, last)
+        begin = int(self.__date_to_timestamp(start_date.strftime("%d/%m/%Y")))
+        end = int(
+            self.__date_to_timestamp(
+                (end_date + timedelta(days=1)).strftime("%d/%m/%Y")
+            )
+        )
+
+        def request(key, fromDate, toDate):
+            return dict(
+                action="HISTORY",
+                actionType="DATA",
+                symbol=symbol,
+                chartTF=key,
+                fromDate=fromDate,
+                toDate=toDate,
+            )
+
+        pbar = tqdm(total=round((end - begin) / 86400))
+        # a month at a time keeps memory bounded on long backfills
+        for since in range(begin, end, ARCHIVE_SPAN):
+            chunker = AdaptiveChunker(
+                since,
+                min(since + ARCHIVE_SPAN, end),
+                "TICK",
+                rows=rows,
+                latency=self.__timeout / 2,
+            )
+            # a failed window raises before the month is appended, the archive
+            # resumes after the last month written
+            try:
+                replies = HistoryEngine(self.__pool).fetch_adaptive(
+                    {"TICK": chunker}, request, pbar, decode=self.__decode("TICK")
+                )
+            except IncompleteHistory as e:
+                self.__discard(data for _, data in e.replies["TICK"])
+                pbar.close()
+                raise
+            decoder = HistoryDecoder("TICK")
+            for window, data in replies["TICK"]:
+                if data is not None and isinstance(data, (dict, Future)):
+                    try:
+                        self.__append(decoder, data)
+                    except Exception as e:
+                        logging.info(
+                            f"Error while processing ticks {symbol}. Error message: {str(e)}"
+                        )
+            time, (bid, ask) = decoder.arrays()
+            archive.append(time, bid, ask)
+        pbar.close()
+        return archive
+
+    def ticks(self, symbol, path="DataBase/ticks", live=False):
+        """Open the tick archive of a symbol for memory-mapped reads
+
+        live=True opens the ticks record() wrote instead of the backfilled ones.
+        """
+        name = f"{symbol}.live.ticks" if live else f"{symbol}.ticks"
+        return TickArchive(os.path.join(path, name))
+
+    def close(self):
+        """Stop the mirror, the streams, the sockets and the decode processes"""
+        if self.__mirror is not None:
+            self.__mirror.close()
+            self.__mirror = None
+        for subscriptions in (self.__subscriptions, self.__events):
+            if subscriptions is not None:
+                subscriptions.close()
+        self.__subscriptions = self.__events = None
+        self.__price_stream = self.__event_stream = self.__mirror_events = None
+        self.__price_config = self.__event_config = None
+        self.__pool.close()
+        self.__trades.close()
+        self.__api.close()
+        if self.__chunks is not None:
+            self.__chunks.close()
+            self.__chunks = None
+
+    def record(
+        self,
+        symbol,
+        chartTF="TICK",
+        path="DataBase/ticks",
+        maxsize=100000,
+        policy="drop",
+    ):
+        """Append the live ticks of symbols to their tick archives until close()
+
+        Live ticks go to their own archives, read with ticks(symbol, live=True),
+        so archive() still backfills the history before them. The returned
+        TickRecorder counts what it wrote in `written`.
+        """
+        return self.subscriptions.add(
+            symbol,
+            TickRecorder(
+                chartTF,
+                path=path,
+                maxsize=maxsize,
+                subscriptions=self.subscriptions,
+                policy=policy,
+            ),
+        )
+
+    def __date_range(self, fromDate, toDate):
+        if not isinstance(fromDate, int):
+            start_date = datetime.strptime(fromDate, "%d/%m/%Y")
+        else:
+            start_date = self.__brokerTimeDelta(fromDate)
+        if not toDate:
+            end_date = self.__brokerTimeDelta(0)
+        else:
+            end_date = datetime.strptime(toDate, "%d/%m/%Y")
+        return start_date, end_date
+
+    def __decode(self, chartTF):
+        """decode for HistoryEngine when replies are decoded on processes"""
+        if self.__chunks is None:
+            return None
+        return self.__chunks.decoder(chartTF, real_volume=self.real_volume)
+
+    def __append(self, decoder, data):
+        """Add a HISTORY reply, or a chunk decoded on a process, to decoder"""
+        if isinstance(data, Future):
+            ChunkPool.collect(data.result(), decoder)
+        else:
+            decoder.append(data["data"])
+
+    @staticmethod
+    def __discard(replies):
+        """Free the blocks of chunks decoded on processes that are not used"""
+        for data in replies:
+            if isinstance(data, Future):
+                try:
+                    ChunkPool.discard(data.result())
+                except Exception as e:
+                    logging.info(
+                        f"Error while discarding a chunk. Error message: {str(e)}"
+                    )
 
     def __historyThread_save(self, data):
+        # history() waits on the queue for the frame or the error
+        try:
+            self.__historyQ.put(self.__history_fetch())
+        except Exception as e:
+            self.__historyQ.put(e)
+
+    def __history_fetch(self):
         actives = self.__symbol
         chartTF = self.chartTF
         fromDate = self.fromDate
         toDate = self.toDate
-        main = pd.DataFrame()
-        current = pd.DataFrame()
-        self._count = 0
         try:
             os.makedirs("DataBase")
         except OSError:
             pass
         # count data
-        if not isinstance(fromDate, int):
-            start_date = datetime.strptime(fromDate, "%d/%m/%Y")
-        else:
-            start_date = self.__brokerTimeDelta(fromDate)
-        if not toDate:
-            end_date = self.__brokerTimeDelta(0)
-        else:
-            end_date = datetime.strptime(toDate, "%d/%m/%Y")
+        start_date, end_date = self.__date_range(fromDate, toDate)
 
-        delta = timedelta(days=1)
-        delta2 = timedelta(days=1)
-        diff_days = start_date - end_date
-        days_count = diff_days.days
-        pbar = tqdm(total=abs(days_count))
-        appended_data = []
-        active = None
-        df = None
-        while start_date <= end_date:
-            pbar.update(delta.days)
-            fromDate = start_date.strftime("%d/%m/%Y")
-            toDate = start_date
-            toDate += delta2
-            toDate = toDate.strftime("%d/%m/%Y")
-            attempts = 0
-            success = False
-
-            # if chartTF == "TICK":
-            #     chartConvert = 60
-            # else:
-            #     chartConvert = self.__timeframe_to_sec(chartTF)
-            for active in actives:
-                self._count += 1
-
-                # the first symbol on list is the main and the rest will merge
-                if active == actives[0]:
-                    self.__active_name = active
-                    while not success and attempts < 5:
-                        try:
-                            data = self.__api.Command(
-                                action="HISTORY",
-                                actionType="DATA",
-                                symbol=active,
-                                chartTF=chartTF,
-                                fromDate=self.__date_to_timestamp(fromDate),
-                                toDate=self.__date_to_timestamp(toDate),
-                            )
-                            success = True
-                        except Exception as e:
-                            logging.info(
-                                f"Error while processing {active} from {fromDate}. Error message: {str(e)}"
-                            )
-                            attempts += 1
-                    if attempts == 5 and not success:
-                        logging.info(f"Check if {active} is avalible from {fromDate}")
-                        pass
+        # request windows sized by timeframe and adjusted to the replies
+        begin = self.__date_to_timestamp(start_date.strftime("%d/%m/%Y"))
+        end = self.__date_to_timestamp(
+            (end_date + timedelta(days=1)).strftime("%d/%m/%Y")
+        )
+        chunkers = {
+            # replies slower than half the timeout shrink the next windows
+            active: AdaptiveChunker(
+                begin, end, chartTF, rows=self.rows, latency=self.__timeout / 2
+            )
+            for active in actives
+        }
 
-                    if data is not None and isinstance(data, dict):
-                        try:
-                            if data["data"]:
-                                main = pd.DataFrame(data["data"])
-                                main = main.set_index([0])
-                                main.index.name = "date"
-
-                                # TICK DATA
-                                if chartTF == "TICK":
-                                    main.columns = ["bid", "ask"]
-                                    main.index = pd.to_datetime(main.index, unit="ms")
-                                else:
-                                    main.index = pd.to_datetime(main.index, unit="s")
-                                    if self.real_volume:
-                                        del main[5]
-                                    else:
-                                        del main[6]
-                                    main.columns = [
-                                        "open",
-                                        "high",
-                                        "low",
-                                        "close",
-                                        "volume",
-                                        "spread",
-                                    ]
-                        except Exception as e:
-                            logging.info(
-                                f"Error while processing Dataframe {active} from {fromDate}. Error message: {str(e)}"
-                            )
-                            pass
-                else:
-                    while not success and attempts < 2:
-                        try:
-                            data = self.__api.Command(
-                                action="HISTORY",
-                                actionType="DATA",
-                                symbol=active,
-                                chartTF=chartTF,
-                                fromDate=self.__date_to_timestamp(fromDate),
-                                toDate=self.__date_to_timestamp(toDate),
-                            )
-                            success = True
-                        except Exception as e:
-                            logging.info(
-                                f"Error while processing {active}. Error message: {str(e)}"
-                            )
-                            attempts += 1
-                    if attempts == 2 and not success:
-                        logging.info(f"Check if {active} is avalible from {fromDate}")
+        def request(active, fromDate, toDate):
+            return dict(
+                action="HISTORY",
+                actionType="DATA",
+                symbol=active,
+                chartTF=chartTF,
+                fromDate=fromDate,
+                toDate=toDate,
+            )
+
+        pbar = tqdm(total=round((end - begin) / 86400 * len(actives)))
+        try:
+            replies = HistoryEngine(self.__pool).fetch_adaptive(
+                chunkers, request, pbar, decode=self.__decode(chartTF)
+            )
+        except IncompleteHistory as e:
+            for results in e.replies.values():
+                self.__discard(data for _, data in results)
+            raise
+        finally:
+            pbar.close()
+
+        active = None
+        decoders = []
+        prefixes = []
+        names = []
+        for position, active in enumerate(actives):
+            decoder = HistoryDecoder(chartTF, real_volume=self.real_volume)
+            for window, data in replies[active]:
+                if data is not None and isinstance(data, (dict, Future)):
+                    try:
+                        self.__append(decoder, data)
+                    except Exception as e:
+                        since = datetime.fromtimestamp(window[0])
+                        logging.info(
+                            f"Error while processing Dataframe {active} from {since}. "
+                            f"Error message: {str(e)}"
+                        )
                         pass
+            if not len(decoder):
+                if position == 0:
+                    for rest in actives[position + 1 :]:
+                        self.__discard(data for _, data in replies[rest])
+                    break
+                logging.info(f"Check if {active} is avalible from {fromDate}")
+                continue
+            # the first symbol on list is the main and the rest are joined to it
+            decoders.append(decoder)
+            prefixes.append(None if position == 0 else active.lower())
+            names.append(active)
 
-                    if data is not None and isinstance(data, dict):
-                        try:
-                            if data["data"]:
-                                current = pd.DataFrame(data["data"])
-                                current = current.set_index([0])
-                                current.index.name = "date"
-                                active = active.lower()
-                                # TICK DATA
-                                if chartTF == "TICK":
-                                    current.index = pd.to_datetime(
-                                        current.index, unit="ms"
-                                    )
-                                    current.columns = [f"{active}_bid", f"{active}_ask"]
-                                else:
-                                    current.index = pd.to_datetime(
-                                        current.index, unit="s"
-                                    )
-                                    if self.real_volume:
-                                        del current[5]
-                                    else:
-                                        del current[6]
-
-                                    current.columns = [
-                                        f"{active}_open",
-                                        f"{active}_high",
-                                        f"{active}_low",
-                                        f"{active}_close",
-                                        f"{active}_volume",
-                                        f"{active}_spread",
-                                    ]
-
-                                # main = pd.merge(main, current, how='inner',
-                                #                 left_index=True, right_index=True)
-                                main = pd.merge(main, current, on="date")
-                        except Exception as e:
-                            logging.info(
-                                f"Error while merge Dataframe {active}. Error message: {str(e)}"
-                            )
-                            pass
+        if self.__database:
+            # every symbol under its own key with the windows it covers, the
+            # day still running is fetched again by sync
+            now = self.datetime_to_timestamp(self.__brokerTimeDelta(0))
+            for active, decoder in zip(names, decoders):
+                complete = [w for w, _ in replies[active] if w[1] <= now]
+                self.__store_history(
+                    active,
+                    chartTF,
+                    self.__set_utc_or_localtime_tz_df(decoder.frame()),
+                    complete,
+                )
+            return None
 
+        df = None
+        if decoders:
+            self.__active_name = actives[0]
             try:
-                main = main.loc[~main.index.duplicated(keep="first")]
-                appended_data.append(main)
+                df = align(decoders, prefixes, how=self.how)
             except Exception as e:
                 logging.info(
-                    f"Error while finishing Dataframe for {active}. Error message: {str(e)}"
+                    f"Error while merge Dataframe {active}. Error message: {str(e)}"
                 )
-                pass
-            start_date += delta
-        pbar.close()
 
-        if len(appended_data) > 0:
+        if df is not None:
             try:
-                df = pd.concat(appended_data)
+                self.__set_utc_or_localtime_tz_df(df)
             except Exception as e:
                 logging.info(
                     f"Error while processing {active}. Error message: {str(e)}"
                 )
                 pass
+        return df
 
-            if self.__database:
-                start(self.__save_to_db, data=[df], repeat=1, max_threads=20)
-            else:
-                try:
-                    self.__set_utc_or_localtime_tz_df(df)
-                    self.__historyQ.put(df)
-
-                except Exception as e:
-                    logging.info(
-                        f"Error while processing {active}. Error message: {str(e)}"
-                    )
-                    pass
+    @staticmethod
+    def __key(symbol, chartTF):
+        """Database key of the bars of a symbol, shared by every read and write"""
+        return f"{symbol}_{chartTF}"
+
+    def __store_history(self, active, chartTF, df, ranges):
+        """Upsert bars under {symbol}_{chartTF} and add the ranges they cover
+
+        history(database=True) and sync share the key and the ranges, sync
+        only downloads what neither stored. Returns the stored frame.
+        """
+        if self.dbtype == "BARSTORE":
+            if df is not None:
+                self.__store.write(active, chartTF, df)
+            self.__store.add_ranges(active, chartTF, ranges)
+            return None
+
+        q = DictSQLite("history", multithreading=True)
+        key = self.__key(active, chartTF)
+        try:
+            stored = q[key]
+        except KeyError:
+            stored = None
+        try:
+            covered = q[f"{key}_ranges"]
+        except KeyError:
+            covered = []
+        if df is not None:
+            if self.dbtype == "INFLUXDB":
+                self.__client.write_points(df, key, protocol=self.protocol)
+            if stored is not None:
+                df = pd.concat([stored, df])
+                df = df.loc[~df.index.duplicated(keep="last")].sort_index()
+            q[key] = df
+        else:
+            df = stored
+        q[f"{key}_ranges"] = merge_ranges(covered + [list(r) for r in ranges])
+        return df
 
     def __save_to_db(self, df):
-        if self.dbtype == "SQLITE":
+        # the calendar is kept on SQLITE when history uses BARSTORE
+        if self.dbtype in ("SQLITE", "BARSTORE"):
             q = DictSQLite("history", multithreading=True)
             try:
                 self.__set_utc_or_localtime_tz_df(df)
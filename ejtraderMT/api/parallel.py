@@ -0,0 +1,102 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import (
+    get_all_start_methods,
+    get_context,
+    resource_tracker,
+    shared_memory,
+)
+
+import numpy as np
+
+from .decoder import HistoryDecoder
+from .wire import decode_reply
+
+
+def decode_chunk(frames, chartTF, real_volume=False):
+    """Decode the raw frames of one HISTORY reply, runs in a worker process
+
+    The sorted and deduplicated columns are written one after the other to a
+    new shared memory block. Returns (name, rows, [(dtype, offset), ...]),
+    None when the reply has no rows.
+    """
+    reply = decode_reply(frames)
+    if not isinstance(reply, dict):
+        return None
+    data = reply["data"]
+    if data is None or len(data) == 0:
+        return None
+    decoder = HistoryDecoder(chartTF, real_volume=real_volume, capacity=len(data))
+    decoder.append(data)
+    time, values = decoder.arrays()
+    columns = [time] + values
+    rows = len(time)
+    block = shared_memory.SharedMemory(
+        create=True, size=sum(column.nbytes for column in columns)
+    )
+    layout = []
+    offset = 0
+    for column in columns:
+        target = np.ndarray(rows, dtype=column.dtype, buffer=block.buf, offset=offset)
+        target[:] = column
+        layout.append((column.dtype.str, offset))
+        offset += column.nbytes
+    del target
+    # the parent unlinks it once copied
+    block.close()
+    return block.name, rows, layout
+
+
+class ChunkPool:
+    """Decode HISTORY replies on a pool of processes instead of under the GIL
+
+    The raw reply frames go to the workers, the columns come back through
+    shared memory and are copied once into the caller's HistoryDecoder.
+    """
+
+    def __init__(self, processes=None):
+        # workers share the parent's tracker, blocks unlinked here are forgotten
+        resource_tracker.ensure_running()
+        # forking a process with sockets and reader threads running is unsafe
+        method = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes, mp_context=get_context(method)
+        )
+
+    def submit(self, frames, chartTF, real_volume=False):
+        """Future of decode_chunk for one reply"""
+        return self.executor.submit(decode_chunk, frames, chartTF, real_volume)
+
+    def decoder(self, chartTF, real_volume=False):
+        """decode(frames) for HistoryEngine.fetch"""
+        return lambda frames: self.submit(frames, chartTF, real_volume)
+
+    @staticmethod
+    def collect(chunk, decoder):
+        """Append a decoded chunk to decoder and free its block, returns the rows"""
+        if chunk is None:
+            return 0
+        name, rows, layout = chunk
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            columns = [
+                np.ndarray(rows, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+                for dtype, offset in layout
+            ]
+            decoder.extend(*columns)
+            del columns
+        finally:
+            block.close()
+            block.unlink()
+        return rows
+
+    @staticmethod
+    def discard(chunk):
+        """Free the block of a decoded chunk that will not be collected"""
+        if chunk is None:
+            return
+        block = shared_memory.SharedMemory(name=chunk[0])
+        block.close()
+        block.unlink()
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,387 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from queue import Queue, Empty
+from threading import Event, Lock, Thread
+import hashlib
+import logging
+import time
+
+import zmq
+
+SYS_PORT = 15557
+
+
+def parse_endpoints(hosts):
+    """(host, port) pairs from "host", "host:port" or a list of them
+
+    port is the REQ port of a terminal, its live and events ports are the one
+    below and the one above it, as in the default 15556, 15557 and 15558.
+    """
+    if hosts is None:
+        hosts = ["localhost"]
+    elif isinstance(hosts, (str, tuple)):
+        hosts = [hosts]
+    endpoints = []
+    for host in hosts:
+        if isinstance(host, tuple):
+            endpoints.append((host[0], int(host[1])))
+            continue
+        name, _, port = str(host).rpartition(":")
+        if name and port.isdigit():
+            endpoints.append((name, int(port)))
+        else:
+            endpoints.append((str(host), SYS_PORT))
+    return endpoints
+
+
+class Pool(ABC):
+    """Connections handed out by acquire and given back with release"""
+
+    @abstractmethod
+    def acquire(self):
+        """Take a connection"""
+
+    @abstractmethod
+    def release(self, api):
+        """Give a connection back"""
+
+    @contextmanager
+    def connection(self):
+        api = self.acquire()
+        try:
+            yield api
+        finally:
+            self.release(api)
+
+    def burst(self, requests):
+        """Send Command kwargs concurrently, one reply per request in order
+
+        Requests are never retried, a failed one is returned as an error reply
+        so the caller sees the outcome of every item.
+        """
+        tasks = Queue()
+        for index, request in enumerate(requests):
+            tasks.put((index, request))
+        replies = [None] * len(requests)
+
+        def worker():
+            while True:
+                try:
+                    index, request = tasks.get_nowait()
+                except Empty:
+                    return
+                with self.connection() as api:
+                    try:
+                        replies[index] = api.Command(**request)
+                    except Exception as e:
+                        replies[index] = {"error": True, "description": str(e)}
+
+        workers = [
+            Thread(target=worker, daemon=True)
+            for _ in range(min(self.size, len(requests)))
+        ]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return replies
+
+
+class SocketPool(Pool):
+    """Bounded pool of REQ connections created on demand"""
+
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self.__idle = Queue()
+        self.__created = 0
+        self.__lock = Lock()
+        self.__closed = False
+
+    def acquire(self):
+        """Take an idle connection, creating one while under the pool size"""
+        try:
+            return self.__idle.get_nowait()
+        except Empty:
+            pass
+        with self.__lock:
+            if self.__created < self.size:
+                self.__created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self.factory()
+            except Exception:
+                with self.__lock:
+                    self.__created -= 1
+                raise
+        return self.__idle.get()
+
+    def release(self, api):
+        """Give a connection back to the pool, closed once the pool is"""
+        if self.__closed:
+            api.close()
+        else:
+            self.__idle.put(api)
+
+    def close(self):
+        """Close the idle connections and the ones released from now on"""
+        self.__closed = True
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except Empty:
+                return
+
+
+class Terminal:
+    """One MT5 terminal: its endpoint, its socket pool and its health"""
+
+    def __init__(self, host, port, pool):
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self.healthy = True
+        self.busy = 0
+        self.failures = 0
+        self.down_since = None
+
+    @property
+    def endpoint(self):
+        return f"{self.host}:{self.port}"
+
+    def __repr__(self):
+        state = "up" if self.healthy else "down"
+        return f"Terminal({self.endpoint}, {state}, busy={self.busy})"
+
+
+class Routed:
+    """Connection of a TerminalPool that moves to another terminal on timeouts
+
+    A command that timed out marks its terminal down and, when it is safe to
+    resend, is sent again to the least busy healthy terminal.
+    """
+
+    def __init__(self, pool, terminal, api):
+        self.pool = pool
+        self.terminal = terminal
+        self.api = api
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
+
+    def Command(self, **kwargs):
+        return self.__send("Command", kwargs)
+
+    def Frames(self, **kwargs):
+        return self.__send("Frames", kwargs)
+
+    def __send(self, method, kwargs):
+        while True:
+            try:
+                return getattr(self.api, method)(**kwargs)
+            except zmq.NotDone:
+                self.pool.fail(self.terminal)
+                if not self.api.retry.retryable(kwargs) or self.__stuck():
+                    raise
+                moved = self.pool.pick()
+                logging.info(
+                    f"Moving {kwargs.get('action')} from {self.terminal.endpoint} to {moved[0].endpoint}"
+                )
+                self.pool.give_back(self.terminal, self.api)
+                self.terminal, self.api = moved
+
+    def __stuck(self):
+        # still up means there was nowhere else to go
+        return self.terminal.healthy or not self.pool.healthy()
+
+
+class TerminalPool(Pool):
+    """Socket pools over several MT5 terminals with sharding and failover
+
+    Connections go to the healthy terminal with the fewest in use, so history
+    workers spread evenly and backfill scales with the number of terminals.
+    Symbols are pinned to one terminal with rendezvous hashing, so each live
+    subscription is configured on a single terminal. A terminal that times out
+    is marked down, its symbols move to the others and a background thread
+    checks it every `interval` seconds until it answers again.
+    """
+
+    def __init__(self, endpoints, factory, size=4, interval=10):
+        # factory(host, port) creates one connection to a terminal
+        self.factory = factory
+        self.interval = interval
+        self.terminals = [
+            Terminal(
+                host,
+                port,
+                SocketPool(lambda host=host, port=port: factory(host, port), size),
+            )
+            for host, port in parse_endpoints(endpoints)
+        ]
+        self.size = sum(terminal.pool.size for terminal in self.terminals)
+        self.__assigned = {}
+        self.__watchers = []
+        self.__lock = Lock()
+        self.__stop = Event()
+        self.__monitor = None
+        # check healthy terminals too, not only the ones down
+        self.__always = False
+
+    def healthy(self):
+        return [terminal for terminal in self.terminals if terminal.healthy]
+
+    def pick(self):
+        """(terminal, connection) of the least busy healthy terminal
+
+        With every terminal down the one down the longest is tried anyway.
+        """
+        with self.__lock:
+            candidates = self.healthy()
+            if candidates:
+                terminal = min(candidates, key=lambda t: t.busy)
+            else:
+                terminal = min(self.terminals, key=lambda t: t.down_since)
+            terminal.busy += 1
+        try:
+            return terminal, terminal.pool.acquire()
+        except Exception:
+            with self.__lock:
+                terminal.busy -= 1
+            raise
+
+    def give_back(self, terminal, api):
+        with self.__lock:
+            terminal.busy -= 1
+        terminal.pool.release(api)
+
+    def acquire(self):
+        terminal, api = self.pick()
+        return Routed(self, terminal, api)
+
+    def release(self, routed):
+        self.give_back(routed.terminal, routed.api)
+
+    def fail(self, terminal):
+        """Mark a terminal down and move its symbols to the healthy ones
+
+        A terminal stays up while no other healthy one could take its work.
+        """
+        with self.__lock:
+            terminal.failures += 1
+            if not terminal.healthy:
+                return
+            if not [t for t in self.healthy() if t is not terminal]:
+                return
+            terminal.healthy = False
+            terminal.down_since = time.time()
+            moved = [k for k, t in self.__assigned.items() if t is terminal]
+            for key in moved:
+                del self.__assigned[key]
+            self.__spawn()
+        logging.info(f"Metatrader 5 terminal {terminal.endpoint} is down")
+        for callback in list(self.__watchers):
+            try:
+                callback(terminal, moved)
+            except Exception as e:
+                logging.info(f"Error while failing over. Error message: {str(e)}")
+
+    def watch(self, callback):
+        """callback(terminal, keys) runs when a terminal goes down"""
+        self.__watchers.append(callback)
+
+    def assign(self, key):
+        """Terminal serving a symbol, kept until that terminal goes down"""
+        with self.__lock:
+            terminal = self.__assigned.get(key)
+            if terminal is not None and terminal.healthy:
+                return terminal
+            candidates = self.healthy() or self.terminals
+            terminal = max(
+                candidates,
+                key=lambda t: hashlib.md5(f"{key}|{t.endpoint}".encode()).digest(),
+            )
+            self.__assigned[key] = terminal
+            return terminal
+
+    def command(self, key, **kwargs):
+        """Send a command to the terminal serving key, another one if it is down"""
+        while True:
+            terminal = self.assign(key)
+            try:
+                with terminal.pool.connection() as api:
+                    return api.Command(**kwargs)
+            except zmq.NotDone:
+                self.fail(terminal)
+                if terminal.healthy or not self.healthy():
+                    raise
+
+    def check(self):
+        """Ping every terminal now, returns {endpoint: healthy}"""
+        for terminal in self.terminals:
+            self.__ping(terminal)
+        return {terminal.endpoint: terminal.healthy for terminal in self.terminals}
+
+    def __ping(self, terminal):
+        try:
+            with terminal.pool.connection() as api:
+                reply = api.Command(action="BALANCE")
+        except Exception:
+            reply = None
+        if isinstance(reply, dict):
+            if not terminal.healthy:
+                logging.info(f"Metatrader 5 terminal {terminal.endpoint} is back")
+            with self.__lock:
+                terminal.healthy = True
+                terminal.down_since = None
+        elif terminal.healthy:
+            self.fail(terminal)
+
+    def start(self):
+        """Check every terminal each `interval` seconds from now on"""
+        with self.__lock:
+            self.__always = True
+            self.__spawn()
+
+    def __spawn(self):
+        if self.__monitor is None:
+            self.__monitor = Thread(target=self.__run, daemon=True)
+            self.__monitor.start()
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            with self.__lock:
+                if self.__always:
+                    targets = list(self.terminals)
+                else:
+                    targets = [t for t in self.terminals if not t.healthy]
+                if not targets:
+                    self.__monitor = None
+                    return
+            for terminal in targets:
+                self.__ping(terminal)
+
+    def sockets(self, kind):
+        """One PULL socket connected to the live or events port of every terminal"""
+        offset = {"live": -1, "events": 1}[kind]
+        context = zmq.Context.instance()
+        try:
+            socket = context.socket(zmq.PULL)
+            for terminal in self.terminals:
+                socket.connect(
+                    "tcp://{}:{}".format(terminal.host, terminal.port + offset)
+                )
+        except zmq.ZMQError:
+            raise zmq.ZMQBindError(f"{kind.capitalize()} port connection ERROR")
+        if len(self.terminals) > 1:
+            # a silent terminal stops the symbols it streams, find it early
+            self.start()
+        return socket
+
+    def close(self):
+        """Stop the monitor and close the connections to every terminal"""
+        self.__stop.set()
+        for terminal in self.terminals:
+            terminal.pool.close()
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from .history import TIMEFRAMES
+from .utils import WEEK_ANCHOR
+
+
+def buckets(time, chartTF, offset=0):
+    """Start of the chartTF candle of each timestamp in seconds
+
+    offset is the broker UTC offset in seconds, buckets follow broker midnight
+    when the timestamps are UTC. Broker time stamps need offset 0.
+    """
+    local = time + offset
+    if chartTF == "MN":
+        months = local.astype("datetime64[s]").astype("datetime64[M]")
+        start = months.astype("datetime64[s]").astype(np.int64)
+    elif chartTF == "W1":
+        week = TIMEFRAMES["W1"]
+        start = (local - WEEK_ANCHOR) // week * week + WEEK_ANCHOR
+    else:
+        size = TIMEFRAMES[chartTF]
+        start = local // size * size
+    return start - offset
+
+
+def bucket(time, chartTF, offset=0):
+    """Start of the chartTF candle of one timestamp in seconds"""
+    local = time + offset
+    if chartTF == "MN":
+        month = np.datetime64(int(local), "s").astype("datetime64[M]")
+        start = int(month.astype("datetime64[s]").astype(np.int64))
+    elif chartTF == "W1":
+        week = TIMEFRAMES["W1"]
+        start = (local - WEEK_ANCHOR) // week * week + WEEK_ANCHOR
+    else:
+        size = TIMEFRAMES[chartTF]
+        start = local // size * size
+    return start - offset
+
+
+def aggregate(time, columns, chartTF, offset=0):
+    """OHLC, volume and spread per candle from sorted time and bar columns
+
+    columns holds open, high, low, close, volume and spread arrays.
+    """
+    start = buckets(time, chartTF, offset)
+    if not len(start):
+        return start, [np.empty(0) for _ in range(6)]
+    edges = np.flatnonzero(start[1:] != start[:-1]) + 1
+    first = np.concatenate(([0], edges))
+    last = np.concatenate((edges, [len(start)])) - 1
+    open_, high, low, close, volume, spread = columns
+    return start[first], [
+        open_[first],
+        np.maximum.reduceat(high, first),
+        np.minimum.reduceat(low, first),
+        close[last],
+        np.add.reduceat(volume, first),
+        # MT5 candles keep the lowest spread of the period
+        np.minimum.reduceat(spread, first),
+    ]
+
+
+def resample(df, chartTF, offset=0, point=None):
+    """Build chartTF candles from a bars or ticks DataFrame indexed by date
+
+    Bars need open, high, low, close, volume and spread columns. Ticks need bid
+    and ask, candles are built on bid with the tick count as volume and the
+    spread in points when point is given, otherwise in price.
+    """
+    if chartTF not in TIMEFRAMES:
+        raise KeyError(f"Unknown timeframe {chartTF}")
+    df = df.sort_index()
+    time = df.index.values.astype("datetime64[s]").astype(np.int64)
+    if "bid" in df.columns:
+        bid = df["bid"].to_numpy(dtype=np.float64)
+        spread = df["ask"].to_numpy(dtype=np.float64) - bid
+        if point:
+            spread = np.rint(spread / point).astype(np.int64)
+        columns = [bid, bid, bid, bid, np.ones(len(bid), dtype=np.int64), spread]
+    else:
+        columns = [
+            df[c].to_numpy()
+            for c in ("open", "high", "low", "close", "volume", "spread")
+        ]
+
+    start, values = aggregate(time, columns, chartTF, offset)
+    index = pd.DatetimeIndex(pd.to_datetime(start, unit="s"), name="date")
+    return pd.DataFrame(
+        dict(zip(("open", "high", "low", "close", "volume", "spread"), values)),
+        index=index,
+    )
@@ -0,0 +1,84 @@
+from threading import Condition
+import time
+
+# actions that only read state, resending them after a timeout is harmless
+IDEMPOTENT = frozenset(
+    (
+        "ACCOUNT",
+        "BALANCE",
+        "POSITIONS",
+        "ORDERS",
+        "HISTORY",
+        "CALENDAR",
+        "LISTSYMBOLS",
+        "CONFIG",
+    )
+)
+
+
+class RetryPolicy:
+    """How many times and how fast a timed out command is sent again
+
+    Only idempotent actions are retried. A TRADE that timed out may still have
+    been executed by the terminal, so it is never resent blindly: the caller
+    gets the error and has to check positions and orders.
+    """
+
+    def __init__(
+        self, attempts=3, backoff=0.1, factor=2.0, max_backoff=2.0, idempotent=None
+    ):
+        self.attempts = max(1, int(attempts))
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.idempotent = IDEMPOTENT if idempotent is None else frozenset(idempotent)
+
+    def retryable(self, request):
+        return request.get("action") in self.idempotent
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number attempt, starting at 1"""
+        return min(self.backoff * self.factor ** (attempt - 1), self.max_backoff)
+
+
+class Backlog:
+    """Requests in flight to one terminal, the EA answers them one at a time
+
+    Every connection to the same terminal shares one Backlog. At most `limit`
+    requests are in flight, the others wait for a slot before sending, and a
+    request's timeout is scaled by the depth of the queue it joined since it
+    waits for the ones ahead of it too.
+
+    A timeout is backpressure: the request is still queued on the EA, so the
+    slots are halved and nothing is sent for `pause` seconds. Each reply gives
+    one slot back.
+    """
+
+    def __init__(self, limit=2):
+        self.limit = max(1, int(limit))
+        self.allowed = self.limit
+        self.inflight = 0
+        self.__resume = 0
+        self.__cond = Condition()
+
+    def enter(self):
+        """Wait for a slot, returns the queue depth counting this request"""
+        with self.__cond:
+            while True:
+                wait = self.__resume - time.monotonic()
+                if wait <= 0 and self.inflight < self.allowed:
+                    break
+                self.__cond.wait(wait if wait > 0 else None)
+            self.inflight += 1
+            return self.inflight
+
+    def leave(self, pause=0):
+        """Free the slot, pause seconds after a timeout"""
+        with self.__cond:
+            self.inflight -= 1
+            if pause:
+                self.allowed = max(1, self.allowed // 2)
+                self.__resume = max(self.__resume, time.monotonic() + pause)
+            elif self.allowed < self.limit:
+                self.allowed += 1
+            self.__cond.notify_all()
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from .utils import add_ranges, atomic_write, read_ranges
+
+
+class BarStore:
+    """Partitioned history on disk, one NumPy file per symbol, timeframe and period
+
+    Layout: <path>/<symbol>/<chartTF>/<partition>.npy where the partition is the
+    month (YYYY-MM) for bars and the day (YYYY-MM-DD) for TICK and TS. Files are
+    opened memory-mapped so a range query only reads the partitions it touches.
+    """
+
+    def __init__(self, path="DataBase/store"):
+        self.path = path
+
+    def __folder(self, symbol, chartTF):
+        return os.path.join(self.path, symbol, chartTF)
+
+    def __partition(self, chartTF):
+        return "%Y-%m-%d" if chartTF in ("TICK", "TS") else "%Y-%m"
+
+    @staticmethod
+    def __bound(date, end=False):
+        if date is None:
+            return None
+        if isinstance(date, str):
+            date = datetime.strptime(date, "%d/%m/%Y")
+            # a date string covers the whole day
+            if end:
+                date += timedelta(days=1)
+        return pd.Timestamp(date).value
+
+    def symbols(self):
+        return sorted(os.listdir(self.path)) if os.path.isdir(self.path) else []
+
+    def timeframes(self, symbol):
+        folder = os.path.join(self.path, symbol)
+        return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+    def partitions(self, symbol, chartTF):
+        folder = self.__folder(symbol, chartTF)
+        return sorted(
+            os.path.basename(f)[:-4] for f in glob.glob(os.path.join(folder, "*.npy"))
+        )
+
+    def write(self, symbol, chartTF, df):
+        """Upsert a DataFrame indexed by date, rows with the same date are replaced"""
+        if df is None or not len(df):
+            return
+        folder = self.__folder(symbol, chartTF)
+        os.makedirs(folder, exist_ok=True)
+        df = df.sort_index()
+        keys = df.index.strftime(self.__partition(chartTF))
+        for partition in pd.unique(keys):
+            part = df[keys == partition]
+            filename = os.path.join(folder, f"{partition}.npy")
+            if os.path.exists(filename):
+                stored = self.__frame(np.load(filename))
+                part = pd.concat([stored, part])
+                part = part.loc[~part.index.duplicated(keep="last")].sort_index()
+            records = self.__records(part)
+            atomic_write(filename, lambda f: np.save(f, records), binary=True)
+
+    def read(self, symbol, chartTF, fromDate=None, toDate=None):
+        """Rows between fromDate and toDate reading only the partitions in range"""
+        begin = self.__bound(fromDate)
+        end = self.__bound(toDate, end=True)
+        fmt = self.__partition(chartTF)
+        first = pd.Timestamp(begin).strftime(fmt) if begin is not None else None
+        last = pd.Timestamp(end).strftime(fmt) if end is not None else None
+
+        chunks = []
+        for partition in self.partitions(symbol, chartTF):
+            if (first and partition < first) or (last and partition > last):
+                continue
+            filename = os.path.join(self.__folder(symbol, chartTF), f"{partition}.npy")
+            records = np.load(filename, mmap_mode="r")
+            time = records["time"]
+            lo = np.searchsorted(time, begin, "left") if begin is not None else 0
+            hi = np.searchsorted(time, end, "left") if end is not None else len(time)
+            if hi > lo:
+                chunks.append(np.array(records[lo:hi]))
+        if not chunks:
+            return None
+        return self.__frame(np.concatenate(chunks))
+
+    def ranges(self, symbol, chartTF):
+        """Time ranges already downloaded, kept by sync"""
+        return read_ranges(self.__folder(symbol, chartTF))
+
+    def add_ranges(self, symbol, chartTF, ranges):
+        add_ranges(self.__folder(symbol, chartTF), ranges)
+
+    @staticmethod
+    def __records(df):
+        dtype = [("time", "<i8")] + [
+            (str(column), df[column].dtype.str) for column in df.columns
+        ]
+        records = np.empty(len(df), dtype=dtype)
+        records["time"] = df.index.values.astype("datetime64[ns]").view("i8")
+        for column in df.columns:
+            records[str(column)] = df[column].values
+        return records
+
+    @staticmethod
+    def __frame(records):
+        index = pd.DatetimeIndex(records["time"].astype("datetime64[ns]"), name="date")
+        return pd.DataFrame(
+            {name: records[name] for name in records.dtype.names[1:]}, index=index
+        )
@@ -0,0 +1,498 @@
+from collections import OrderedDict, deque, namedtuple
+from threading import Condition, Lock, Thread
+import asyncio
+import logging
+
+import numpy as np
+import pandas as pd
+import zmq
+
+from .wire import decode_reply
+
+# lightweight streaming records, plain tuples without per-instance dict
+Tick = namedtuple("Tick", "symbol time bid ask")
+Trade = namedtuple("Trade", "symbol time type bid ask last volume")
+Bar = namedtuple("Bar", "symbol time open high low close volume spread")
+
+
+def parse(msg, chartTF, real_volume=False):
+    """Records of one live message, time in ms for TICK/TS and s for bars"""
+    data = msg.get("data") if isinstance(msg, dict) else None
+    if data is None or len(data) == 0:
+        return []
+    symbol = msg.get("symbol")
+    if isinstance(data, np.ndarray):
+        rows = data.tolist()
+    elif isinstance(data[0], (list, tuple)):
+        rows = data
+    else:
+        rows = [data]
+
+    if chartTF == "TICK":
+        return [Tick(symbol, int(row[0]), row[1], row[2]) for row in rows]
+    if chartTF == "TS":
+        return [Trade(symbol, int(row[0]), *row[1:6]) for row in rows]
+    volume = 6 if real_volume else 5
+    return [
+        Bar(symbol, int(row[0]), row[1], row[2], row[3], row[4], row[volume], row[7])
+        for row in rows
+    ]
+
+
+def kind(msg):
+    """TICK, TS or BARS from the width of the rows of a live message"""
+    data = msg.get("data")
+    if data is None or len(data) == 0:
+        return None
+    if isinstance(data, np.ndarray):
+        width = len(data.dtype.names or ()) or data.shape[-1]
+    else:
+        width = len(data[0]) if isinstance(data[0], (list, tuple)) else len(data)
+    return {3: "TICK", 6: "TS"}.get(width, "BARS")
+
+
+def symbol_of(record):
+    """Conflation key of a price record or an event dict"""
+    if isinstance(record, dict):
+        return record.get("symbol")
+    return record.symbol
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def to_frame(records):
+    """Build one DataFrame indexed by date from a batch of records"""
+    if not records:
+        return pd.DataFrame()
+    if isinstance(records[0], dict):
+        return pd.DataFrame(records)
+    df = pd.DataFrame.from_records(records, columns=records[0]._fields)
+    unit = "s" if isinstance(records[0], Bar) else "ms"
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop("time"), unit=unit), name="date")
+    return df
+
+
+class PriceStream:
+    """Buffer of the records of one subscription with a backpressure policy
+
+    policy decides what happens when consumers fall behind:
+    "drop" keeps the newest maxsize records dropping the oldest,
+    "conflate" keeps only the latest record of each symbol,
+    "block" holds the reader thread until there is room again, which also
+    stalls every other subscriber of the socket.
+    `dropped` counts the records dropped or conflated. With a TickCache every
+    record is also kept in its symbol ring for windowed reads, with a
+    BarBuilder ticks are aggregated into candles, both before the policy
+    applies so they never miss a tick.
+    """
+
+    POLICIES = ("drop", "conflate", "block")
+
+    def __init__(
+        self,
+        chartTF,
+        maxsize=100000,
+        cache=None,
+        bars=None,
+        subscriptions=None,
+        policy="drop",
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy}")
+        self.chartTF = chartTF
+        self.cache = cache
+        self.bars = bars
+        self.policy = policy
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.__subscriptions = subscriptions
+        if policy == "conflate":
+            self.__buffer = OrderedDict()
+        elif policy == "drop":
+            self.__buffer = deque(maxlen=maxsize)
+        else:
+            self.__buffer = deque()
+        self.__ready = Condition()
+        self.__waiters = []
+        self.__running = True
+
+    def put(self, records):
+        """Called by the reader thread with the records of one message"""
+        if self.cache is not None:
+            for record in records:
+                self.cache.append(record)
+        if self.bars is not None and self.chartTF in ("TICK", "TS"):
+            for record in records:
+                self.bars.update(record)
+        with self.__ready:
+            if self.policy == "conflate":
+                for record in records:
+                    key = symbol_of(record)
+                    if key in self.__buffer:
+                        self.dropped += 1
+                    # a newer record keeps the queue position of the stale one
+                    self.__buffer[key] = record
+            elif self.policy == "drop":
+                overflow = len(self.__buffer) + len(records) - self.maxsize
+                if overflow > 0:
+                    self.dropped += overflow
+                self.__buffer.extend(records)
+            else:
+                for record in records:
+                    self.__ready.wait_for(
+                        lambda: len(self.__buffer) < self.maxsize or not self.__running
+                    )
+                    if not self.__running:
+                        return
+                    self.__buffer.append(record)
+            self.__ready.notify_all()
+            waiters, self.__waiters = self.__waiters, []
+        for loop, future in waiters:
+            # the loop of an aget that gave up may be gone already
+            if loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass
+
+    def __pop(self):
+        if self.policy == "conflate":
+            return self.__buffer.popitem(last=False)[1]
+        return self.__buffer.popleft()
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    def get(self, timeout=None):
+        """Oldest record, waits for one up to timeout seconds"""
+        with self.__ready:
+            if not self.__ready.wait_for(lambda: self.__buffer, timeout):
+                return None
+            record = self.__pop()
+            self.__ready.notify_all()
+            return record
+
+    def drain(self, limit=None, timeout=None):
+        """Every buffered record up to limit, waits for the first one"""
+        with self.__ready:
+            if not self.__ready.wait_for(lambda: self.__buffer, timeout):
+                return []
+            count = len(self.__buffer) if limit is None else limit
+            records = []
+            while self.__buffer and len(records) < count:
+                records.append(self.__pop())
+            self.__ready.notify_all()
+            return records
+
+    def frame(self, limit=None, timeout=None):
+        """Drain the buffer into a DataFrame"""
+        return to_frame(self.drain(limit, timeout))
+
+    def __iter__(self):
+        while self.__running:
+            record = self.get(timeout=0.1)
+            if record is not None:
+                yield record
+
+    async def aget(self, timeout=None):
+        """Oldest record without blocking the event loop, None on timeout"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.__ready:
+                if self.__buffer:
+                    record = self.__pop()
+                    self.__ready.notify_all()
+                    return record
+                waiter = (loop, loop.create_future())
+                self.__waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                # timed out or cancelled, put() must not wake it anymore
+                with self.__ready:
+                    if waiter in self.__waiters:
+                        self.__waiters.remove(waiter)
+
+    async def __aiter__(self):
+        while self.__running:
+            record = await self.aget(timeout=0.1)
+            if record is not None:
+                yield record
+
+    def close(self):
+        with self.__ready:
+            self.__running = False
+            self.__ready.notify_all()
+        if self.__subscriptions is not None:
+            self.__subscriptions.remove(self)
+
+
+class Callback(PriceStream):
+    """Subscriber calling a function with every record on its own thread
+
+    Records wait in the subscriber's own buffer under its policy, so a slow
+    callback never holds the reader thread or the other subscribers.
+    """
+
+    def __init__(
+        self, chartTF, function, maxsize=100000, subscriptions=None, policy="drop"
+    ):
+        super().__init__(
+            chartTF, maxsize=maxsize, subscriptions=subscriptions, policy=policy
+        )
+        self.function = function
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        for record in self:
+            try:
+                self.function(record)
+            except Exception as e:
+                logging.info(f"Error in stream callback. Error message: {str(e)}")
+
+    def close(self):
+        super().close()
+        self.__thread.join()
+
+
+class Subscriptions:
+    """One live socket and one reader thread shared by every subscription
+
+    Messages are routed by symbol to the subscribers of that symbol, each
+    subscriber gets the records parsed for its own timeframe. `configure` is
+    called once per new (symbol, chartTF) pair so repeated subscriptions do not
+    resend CONFIG to the terminal.
+    """
+
+    def __init__(self, socket, configure=None, real_volume=False):
+        self.socket = socket
+        self.configure = configure
+        self.real_volume = real_volume
+        self.__routes = {}
+        self.__lock = Lock()
+        self.__running = True
+        self.__thread = Thread(target=self.__read, daemon=True)
+        self.__thread.start()
+
+    def add(self, symbols, subscriber):
+        """Route the records of symbols to subscriber, returns the subscriber
+
+        symbols is one symbol or a list, None routes every message of the
+        socket to the subscriber.
+        """
+        if symbols is None or isinstance(symbols, str):
+            symbols = [symbols]
+        else:
+            symbols = list(symbols)
+        with self.__lock:
+            pairs = self.pairs()
+            for symbol in symbols:
+                routes = self.__routes.setdefault(symbol, [])
+                if subscriber not in routes:
+                    routes.append(subscriber)
+        if self.configure is not None:
+            for symbol in symbols:
+                if symbol is not None and (symbol, subscriber.chartTF) not in pairs:
+                    self.configure(symbol, subscriber.chartTF)
+        return subscriber
+
+    def remove(self, subscriber, symbols=None):
+        """Stop routing symbols, by default every symbol, to subscriber"""
+        with self.__lock:
+            for symbol in list(symbols or self.__routes):
+                routes = self.__routes.get(symbol, [])
+                if subscriber in routes:
+                    routes.remove(subscriber)
+                if not routes:
+                    self.__routes.pop(symbol, None)
+
+    def pairs(self):
+        """Every (symbol, chartTF) currently subscribed"""
+        return {
+            (symbol, subscriber.chartTF)
+            for symbol, routes in self.__routes.items()
+            for subscriber in routes
+        }
+
+    def symbols(self):
+        return list(self.__routes)
+
+    def __read(self):
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        while self.__running:
+            if not poller.poll(100):
+                continue
+            try:
+                msg = decode_reply(self.socket.recv_multipart())
+                self.dispatch(msg)
+            except Exception as e:
+                logging.info(f"Error while processing price. Error message: {str(e)}")
+
+    def dispatch(self, msg):
+        """Parse a message once per timeframe and hand it to subscribers"""
+        if not isinstance(msg, dict):
+            return
+        with self.__lock:
+            routes = self.__routes.get(msg.get("symbol"), [])
+            routes = list(dict.fromkeys(routes + self.__routes.get(None, [])))
+        parsed = {}
+        for subscriber in routes:
+            chartTF = subscriber.chartTF
+            if chartTF not in parsed:
+                parsed[chartTF] = self.records(msg, chartTF)
+            if parsed[chartTF]:
+                subscriber.put(parsed[chartTF])
+
+    def records(self, msg, chartTF):
+        """Records of a message for the subscribers of chartTF"""
+        timeframe = msg.get("timeframe")
+        if timeframe is not None and timeframe != chartTF:
+            return []
+        # without a timeframe field tell ticks from bars by row width
+        if timeframe is None and kind(msg) != (
+            chartTF if chartTF in ("TICK", "TS") else "BARS"
+        ):
+            return []
+        return parse(msg, chartTF, self.real_volume)
+
+    def close(self):
+        """Close every subscriber, then the reader thread and the socket"""
+        with self.__lock:
+            subscribers = list(
+                dict.fromkeys(s for routes in self.__routes.values() for s in routes)
+            )
+        # outside the lock, a subscriber's close removes it from the routes
+        for subscriber in subscribers:
+            subscriber.close()
+        self.__running = False
+        self.__thread.join()
+        self.socket.close()
+
+
+class Events(Subscriptions):
+    """Subscriptions on the event socket, records are the request dicts
+
+    The MqlTradeResult of the request, when the EA sends one, is kept in the
+    record under "result".
+    """
+
+    def records(self, msg, chartTF):
+        request = msg.get("request")
+        if not isinstance(request, dict):
+            return []
+        if isinstance(msg.get("result"), dict):
+            request = dict(request, result=msg["result"])
+        return [request]
+
+
+class RingBuffer:
+    """Fixed capacity NumPy ring of one record type, O(1) append"""
+
+    def __init__(self, capacity, record):
+        self.capacity = capacity
+        self.fields = record._fields[1:]
+        # TICK and TS times are in ms, bars in s
+        self.scale = 1 if record is Bar else 1000
+        self.dtype = np.dtype(
+            [("time", "<i8")] + [(name, "<f8") for name in self.fields[1:]]
+        )
+        self.size = 0
+        self.__data = np.empty(capacity, dtype=self.dtype)
+        self.__next = 0
+        self.__lock = Lock()
+
+    def __len__(self):
+        return self.size
+
+    def append(self, record):
+        """Add a record, a bar with the same time as the newest replaces it"""
+        values = tuple(record[1:])
+        with self.__lock:
+            if self.scale == 1 and self.size:
+                newest = (self.__next - 1) % self.capacity
+                if self.__data["time"][newest] == values[0]:
+                    self.__data[newest] = values
+                    return
+            self.__data[self.__next] = values
+            self.__next = (self.__next + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def last(self, n=None):
+        """Copy of the newest n records in time order"""
+        with self.__lock:
+            n = self.size if n is None else min(n, self.size)
+            start = self.__next - n
+            if start >= 0:
+                return self.__data[start : self.__next].copy()
+            return np.concatenate((self.__data[start:], self.__data[: self.__next]))
+
+    def window(self, seconds):
+        """Copy of the records of the last `seconds` before the newest one"""
+        with self.__lock:
+            if not self.size:
+                return np.empty(0, dtype=self.dtype)
+            newest = self.__data["time"][(self.__next - 1) % self.capacity]
+            since = newest - seconds * self.scale
+            # the ring is two sorted segments, older then newer
+            if self.size < self.capacity:
+                segments = (self.__data[: self.__next],)
+            else:
+                segments = (self.__data[self.__next :], self.__data[: self.__next])
+            parts = []
+            for segment in segments:
+                start = np.searchsorted(segment["time"], since, "right")
+                parts.append(segment[start:])
+            return np.concatenate(parts)
+
+    def frame(self, records):
+        index = pd.DatetimeIndex(
+            pd.to_datetime(records["time"], unit="s" if self.scale == 1 else "ms"),
+            name="date",
+        )
+        return pd.DataFrame(
+            {name: records[name] for name in self.fields[1:]}, index=index
+        )
+
+
+class TickCache:
+    """One RingBuffer per symbol fed by a PriceStream"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.__rings = {}
+
+    def append(self, record):
+        ring = self.__rings.get(record.symbol)
+        if ring is None:
+            ring = self.__rings[record.symbol] = RingBuffer(self.capacity, type(record))
+        ring.append(record)
+
+    def symbols(self):
+        return list(self.__rings)
+
+    def ring(self, symbol):
+        return self.__rings.get(symbol)
+
+    def last(self, symbol, n=None, dataframe=True):
+        """Newest n records of a symbol as a DataFrame or a NumPy array"""
+        ring = self.__rings.get(symbol)
+        if ring is None:
+            return None
+        records = ring.last(n)
+        return ring.frame(records) if dataframe else records
+
+    def window(self, symbol, seconds, dataframe=True):
+        """Records of the last `seconds` of a symbol"""
+        ring = self.__rings.get(symbol)
+        if ring is None:
+            return None
+        records = ring.window(seconds)
+        return ring.frame(records) if dataframe else records
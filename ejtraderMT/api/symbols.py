@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+from threading import Lock
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+
+from .utils import atomic_write
+
+COLUMNS = ["symbol", "expiration", "type"]
+
+
+def expiration_date(value):
+    """Expiration of a LISTSYMBOLS row as a datetime, None when it never expires"""
+    if value in (None, "", 0):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime(1970, 1, 1) + timedelta(seconds=int(value))
+    for fmt in ("%Y.%m.%d %H:%M:%S", "%Y.%m.%d %H:%M", "%Y.%m.%d"):
+        try:
+            date = datetime.strptime(str(value), fmt)
+        except ValueError:
+            continue
+        return None if date.year == 1970 else date
+    return None
+
+
+class SymbolRegistry:
+    """LISTSYMBOLS kept in memory and on disk, refreshed after `ttl` seconds
+
+    Lookups are dict reads without a round trip. The last list is saved to
+    `path` so a new process starts from it instead of asking the terminal.
+    `server` names the terminal it came from, a list saved by another one is
+    not loaded.
+    """
+
+    def __init__(
+        self, fetch=None, path="DataBase/symbols.json", ttl=86400, server=None
+    ):
+        self.fetch = fetch
+        self.path = path
+        self.ttl = ttl
+        self.server = server
+        self.updated = None
+        self.__symbols = {}
+        self.__lock = Lock()
+        self.__load()
+
+    def __load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get("server") != self.server:
+                return
+            self.__index(saved["data"])
+            self.updated = saved["updated"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def __save(self, rows):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        saved = {"server": self.server, "updated": self.updated, "data": rows}
+        atomic_write(self.path, lambda f: json.dump(saved, f))
+
+    def __index(self, rows):
+        symbols = {}
+        for row in rows:
+            symbol, expiration, kind = row[:3]
+            # listed twice keeps the first one
+            if symbol not in symbols:
+                symbols[symbol] = {
+                    "symbol": symbol,
+                    "expiration": expiration,
+                    "type": kind,
+                    "expires": expiration_date(expiration),
+                }
+        self.__symbols = symbols
+
+    def refresh(self):
+        """Download the symbol list now"""
+        reply = self.fetch()
+        rows = [list(row) for row in reply["data"]]
+        with self.__lock:
+            self.__index(rows)
+            self.updated = time.time()
+            try:
+                self.__save(rows)
+            except OSError as e:
+                logging.info(f"Error while saving symbols. Error message: {str(e)}")
+        return len(self.__symbols)
+
+    def expired(self):
+        return self.updated is None or time.time() - self.updated > self.ttl
+
+    def ensure(self):
+        """Refresh when expired, keep the old list if the terminal does not answer"""
+        if not self.expired():
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            if not self.__symbols:
+                raise
+            logging.info(f"Keeping the cached symbols. Error message: {str(e)}")
+
+    def get(self, symbol):
+        """Properties of a symbol, None when the broker does not list it"""
+        self.ensure()
+        return self.__symbols.get(symbol)
+
+    def __contains__(self, symbol):
+        return self.get(symbol) is not None
+
+    def __len__(self):
+        self.ensure()
+        return len(self.__symbols)
+
+    def filter(self, type=None, expires_before=None, expires_after=None):
+        """Symbols of a type or a list of types, expiring inside a date range"""
+        self.ensure()
+        types = None
+        if type is not None:
+            types = {type} if isinstance(type, str) else set(type)
+        symbols = []
+        for info in self.__symbols.values():
+            if types is not None and info["type"] not in types:
+                continue
+            if expires_before is not None or expires_after is not None:
+                expires = info["expires"]
+                if expires is None:
+                    continue
+                if expires_before is not None and expires >= pd.Timestamp(
+                    expires_before
+                ):
+                    continue
+                if expires_after is not None and expires < pd.Timestamp(expires_after):
+                    continue
+            symbols.append(info)
+        return symbols
+
+    def frame(self, symbols=None):
+        """DataFrame with symbol, expiration and type columns"""
+        if symbols is None:
+            self.ensure()
+            symbols = self.__symbols.values()
+        return pd.DataFrame(
+            [[info[column] for column in COLUMNS] for info in symbols], columns=COLUMNS
+        )
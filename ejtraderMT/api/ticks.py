@@ -0,0 +1,173 @@
+from threading import Event, Thread
+import logging
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from .stream import PriceStream
+
+# archive file: header + fixed width records appended in time order
+# header: magic, version, record size
+HEADER = struct.Struct("<4sHH8x")
+MAGIC = b"EJTK"
+VERSION = 1
+TICK = np.dtype([("time", "<i8"), ("bid", "<f8"), ("ask", "<f8")])
+
+
+class TickArchive:
+    """Append-only tick file read back through np.memmap
+
+    Records are int64 ms timestamps with float64 bid and ask. Readers map the
+    file so several processes share the same pages without copies.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.__map = None
+        self.__last = None
+        if os.path.exists(filename) and os.path.getsize(filename) >= HEADER.size:
+            with open(filename, "rb") as f:
+                magic, version, itemsize = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or itemsize != TICK.itemsize:
+                raise ValueError(f"{filename} is not a tick archive")
+        else:
+            folder = os.path.dirname(filename)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(filename, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, TICK.itemsize))
+
+    def __len__(self):
+        return (os.path.getsize(self.filename) - HEADER.size) // TICK.itemsize
+
+    @property
+    def last(self):
+        """Timestamp in ms of the newest tick, None when empty"""
+        if self.__last is None:
+            count = len(self)
+            if count:
+                with open(self.filename, "rb") as f:
+                    f.seek(HEADER.size + (count - 1) * TICK.itemsize)
+                    self.__last = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+        return self.__last
+
+    def append(self, time, bid, ask):
+        """Append ticks, anything not newer than the last stored tick is skipped"""
+        time = np.asarray(time, dtype=np.int64)
+        if self.last is not None:
+            newer = time > self.last
+            if not newer.all():
+                time = time[newer]
+                bid = np.asarray(bid)[newer]
+                ask = np.asarray(ask)[newer]
+        if not len(time):
+            return 0
+        records = np.empty(len(time), dtype=TICK)
+        records["time"] = time
+        records["bid"] = bid
+        records["ask"] = ask
+        if len(records) > 1 and np.any(records["time"][1:] < records["time"][:-1]):
+            records.sort(order="time", kind="stable")
+        with open(self.filename, "ab") as f:
+            f.write(records.tobytes())
+        self.__last = int(records["time"][-1])
+        return len(records)
+
+    def records(self):
+        """Memory-mapped view of every record, remapped when the file grew"""
+        count = len(self)
+        if self.__map is None or len(self.__map) != count:
+            if count == 0:
+                return np.empty(0, dtype=TICK)
+            self.__map = np.memmap(
+                self.filename, dtype=TICK, mode="r", offset=HEADER.size, shape=(count,)
+            )
+        return self.__map
+
+    def ticks(self, fromDate=None, toDate=None):
+        """Zero-copy slice of the records between two datetimes"""
+        records = self.records()
+        time = records["time"]
+        lo = 0
+        hi = len(records)
+        if fromDate is not None:
+            lo = np.searchsorted(time, pd.Timestamp(fromDate).value // 10**6, "left")
+        if toDate is not None:
+            hi = np.searchsorted(time, pd.Timestamp(toDate).value // 10**6, "left")
+        return records[lo:hi]
+
+    def frame(self, fromDate=None, toDate=None):
+        """DataFrame copy of a slice indexed by date"""
+        records = self.ticks(fromDate, toDate)
+        index = pd.DatetimeIndex(
+            pd.to_datetime(np.asarray(records["time"]), unit="ms"), name="date"
+        )
+        return pd.DataFrame(
+            {"bid": np.asarray(records["bid"]), "ask": np.asarray(records["ask"])},
+            index=index,
+        )
+
+
+class TickRecorder(PriceStream):
+    """Subscriber appending live TICK or TS records to the symbol archives
+
+    Records are written in batches on the recorder's own thread to
+    `{path}/{symbol}.live.ticks`, next to the `{symbol}.ticks` files archive()
+    backfills, so a recording never moves the point a backfill resumes from.
+    close() writes what is still buffered.
+    """
+
+    def __init__(
+        self,
+        chartTF="TICK",
+        path="DataBase/ticks",
+        maxsize=100000,
+        subscriptions=None,
+        policy="drop",
+    ):
+        if chartTF not in ("TICK", "TS"):
+            raise ValueError(f"Only TICK and TS can be recorded, not {chartTF}")
+        super().__init__(
+            chartTF, maxsize=maxsize, subscriptions=subscriptions, policy=policy
+        )
+        self.path = path
+        self.written = 0
+        self.__archives = {}
+        self.__stop = Event()
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def archive(self, symbol):
+        """TickArchive the records of symbol are appended to"""
+        if symbol not in self.__archives:
+            self.__archives[symbol] = TickArchive(
+                os.path.join(self.path, f"{symbol}.live.ticks")
+            )
+        return self.__archives[symbol]
+
+    def __run(self):
+        while not self.__stop.is_set() or len(self):
+            self.__write(self.drain(timeout=0.1))
+
+    def __write(self, records):
+        batches = {}
+        for record in records:
+            batches.setdefault(record.symbol, []).append(record)
+        for symbol, batch in batches.items():
+            try:
+                self.written += self.archive(symbol).append(
+                    [record.time for record in batch],
+                    [record.bid for record in batch],
+                    [record.ask for record in batch],
+                )
+            except Exception as e:
+                logging.info(
+                    f"Error while recording ticks {symbol}. Error message: {str(e)}"
+                )
+
+    def close(self):
+        super().close()
+        self.__stop.set()
+        self.__thread.join()
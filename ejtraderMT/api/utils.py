@@ -0,0 +1,34 @@
+import json
+import os
+
+from .history import merge_ranges
+
+# 1970-01-01 is a Thursday, MT5 weeks start on Sunday
+WEEK_ANCHOR = 3 * 86400
+
+
+def atomic_write(filename, write, binary=False):
+    """Call write(f) on a file next to filename and swap it in
+
+    Readers never see half a file, the temporary name is per process.
+    """
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp, "wb" if binary else "w") as f:
+        write(f)
+    os.replace(tmp, filename)
+
+
+def read_ranges(folder):
+    """[begin, end] ranges saved in folder, [] when there are none"""
+    try:
+        with open(os.path.join(folder, "ranges.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def add_ranges(folder, ranges):
+    """Merge ranges into the ones saved in folder"""
+    os.makedirs(folder, exist_ok=True)
+    merged = merge_ranges(read_ranges(folder) + [list(r) for r in ranges])
+    atomic_write(os.path.join(folder, "ranges.json"), lambda f: json.dump(merged, f))
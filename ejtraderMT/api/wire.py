@@ -0,0 +1,98 @@
+import json
+import struct
+
+import numpy as np
+
+# binary payload: header + packed little-endian records
+# header: magic, version, kind, record size, number of records
+HEADER = struct.Struct("<4sBBHI")
+MAGIC = b"EJMT"
+VERSION = 1
+
+BARS = 1
+TICKS = 2
+TS = 3
+
+DTYPES = {
+    BARS: np.dtype(
+        [
+            ("time", "<i8"),
+            ("open", "<f8"),
+            ("high", "<f8"),
+            ("low", "<f8"),
+            ("close", "<f8"),
+            ("tick_volume", "<i8"),
+            ("real_volume", "<i8"),
+            ("spread", "<i8"),
+        ]
+    ),
+    TICKS: np.dtype([("time", "<i8"), ("bid", "<f8"), ("ask", "<f8")]),
+    TS: np.dtype(
+        [
+            ("time", "<i8"),
+            ("type", "<i8"),
+            ("bid", "<f8"),
+            ("ask", "<f8"),
+            ("last", "<f8"),
+            ("volume", "<f8"),
+        ]
+    ),
+}
+
+
+def kind_of(chartTF):
+    """Payload kind used for a chart timeframe"""
+    if chartTF == "TICK":
+        return TICKS
+    if chartTF == "TS":
+        return TS
+    return BARS
+
+
+def pack(kind, records) -> bytes:
+    """Pack a structured array or list of rows into a binary payload"""
+    dtype = DTYPES[kind]
+    if not isinstance(records, np.ndarray) or records.dtype != dtype:
+        rows = np.asarray(records, dtype=np.float64).reshape(-1, len(dtype.names))
+        array = np.empty(len(rows), dtype=dtype)
+        for i, name in enumerate(dtype.names):
+            array[name] = rows[:, i]
+        records = array
+    return HEADER.pack(MAGIC, VERSION, kind, dtype.itemsize, len(records)) + (
+        records.tobytes()
+    )
+
+
+def unpack(payload) -> np.ndarray:
+    """Read a binary payload as a structured array without copying it"""
+    magic, version, kind, itemsize, count = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unknown binary payload")
+    dtype = DTYPES[kind]
+    if dtype.itemsize != itemsize:
+        raise ValueError("Binary payload record size mismatch")
+    return np.frombuffer(payload, dtype=dtype, count=count, offset=HEADER.size)
+
+
+def decode_reply(frames) -> dict:
+    """JSON reply, a second frame if present carries the binary data"""
+    msg = json.loads(frames[0])
+    if len(frames) > 1 and isinstance(msg, dict):
+        msg["data"] = unpack(frames[1])
+    return msg
+
+
+def count_rows(frames) -> int:
+    """Rows of a raw HISTORY reply without decoding it"""
+    if len(frames) > 1:
+        return HEADER.unpack_from(frames[1])[4]
+    # every JSON row is a list inside the data list
+    return max(frames[0].count(b"[") - 1, 0)
+
+
+def encode_reply(msg, kind=None, records=None) -> list:
+    """Frames for a reply, records are sent binary when kind is given"""
+    if kind is None:
+        return [json.dumps(msg).encode()]
+    msg = dict(msg, data=None, encoding="binary")
+    return [json.dumps(msg).encode(), pack(kind, records)]
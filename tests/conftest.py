@@ -0,0 +1,40 @@
+import itertools
+
+import pytest
+
+from ejtraderMT import Metatrader
+from ejtraderMT.api.mock import MockServer
+
+# REQ ports three apart, each server also binds the port below and above,
+# under the ephemeral range so no client socket of an earlier test holds one
+PORTS = itertools.count(25557, 3)
+
+
+@pytest.fixture
+def mock_server():
+    """Factory of started MockServers on free ports, stopped after the test"""
+    servers = []
+
+    def start(**kwargs):
+        server = MockServer(host="127.0.0.1", port=next(PORTS), **kwargs)
+        servers.append(server.start())
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def metatrader():
+    """Factory of Metatrader clients of a MockServer, closed after the test"""
+    clients = []
+
+    def connect(server, **kwargs):
+        api = Metatrader(f"127.0.0.1:{server.SYS_PORT}", **kwargs)
+        clients.append(api)
+        return api
+
+    yield connect
+    for api in clients:
+        api.close()
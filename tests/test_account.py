@@ -0,0 +1,39 @@
+import time
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_mirror_applies_trade_events_locally(mock_server, metatrader):
+    server = mock_server()
+    api = metatrader(server)
+    # no reconciliation during the test, only the events update the book
+    mirror = api.mirror(reconcile=60, settle=60)
+    assert mirror.positions() == [] and mirror.orders() == []
+
+    api.buy("EURUSD", 0.1, 0, 0)
+    api.sellLimit("GBPUSD", 0.2, 0, 0, 1.3)
+    assert wait_for(lambda: mirror.positions() and mirror.orders())
+    assert mirror.volume("EURUSD") == 0.1
+    assert [order["symbol"] for order in mirror.orders()] == ["GBPUSD"]
+    assert server.served["POSITIONS"] == 1
+
+    ticket = mirror.positions("EURUSD")[0]["id"]
+    api.positionModify(ticket, 1.0, 1.2)
+    assert wait_for(lambda: mirror.position(ticket)["takeprofit"] == 1.2)
+
+
+def test_close_all_closes_the_mirrored_positions(mock_server, metatrader):
+    server = mock_server()
+    api = metatrader(server)
+    mirror = api.mirror(reconcile=60, settle=60)
+    api.buy("EURUSD", 0.1, 0, 0)
+    api.buy("GBPUSD", 0.1, 0, 0)
+    assert wait_for(lambda: len(mirror.positions()) == 2)
+    replies = api.close_all()
+    assert len(replies) == 2 and not any(reply.get("error") for reply in replies)
+    assert server.open_positions == {}
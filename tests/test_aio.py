@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from ejtraderMT.api.aio import AsyncMetatrader
+from ejtraderMT.api.history import IncompleteHistory
+from ejtraderMT.api.retry import RetryPolicy
+
+
+def run(server, coroutine, **kwargs):
+    async def main():
+        api = AsyncMetatrader(f"127.0.0.1:{server.SYS_PORT}", **kwargs)
+        try:
+            return await coroutine(api)
+        finally:
+            api.close()
+
+    return asyncio.run(main())
+
+
+def test_commands_are_pipelined_on_one_socket(mock_server):
+    server = mock_server()
+
+    async def balances(api):
+        return await asyncio.gather(*(api.balance() for _ in range(20)))
+
+    replies = run(server, balances)
+    assert [reply["balance"] for reply in replies] == [10000.0] * 20
+
+
+def test_history_of_several_symbols(mock_server):
+    server = mock_server()
+
+    async def history(api):
+        return await api.history(
+            ["EURUSD", "GBPUSD"], "H1", "01/01/2024", "10/01/2024", rows=48
+        )
+
+    df = run(server, history)
+    assert len(df) == 240
+    assert "gbpusd_close" in df.columns
+    assert server.served["HISTORY"] == 10
+
+
+def test_history_raises_on_missing_windows(mock_server):
+    server = mock_server()
+    handler = server.handlers["HISTORY"]
+
+    def stall_gbpusd(request):
+        if request["symbol"] == "GBPUSD":
+            time.sleep(0.3)
+        return handler(request)
+
+    server.handlers["HISTORY"] = stall_gbpusd
+
+    async def history(api):
+        return await api.history(
+            ["EURUSD", "GBPUSD"], "H1", "01/01/2024", "02/01/2024", rows=48
+        )
+
+    with pytest.raises(IncompleteHistory) as error:
+        run(server, history, timeout=100, retry=RetryPolicy(attempts=1))
+    assert {request["symbol"] for request in error.value.failed} == {"GBPUSD"}
+
+
+def test_pending_orders_match_the_sync_client(mock_server, metatrader):
+    server = mock_server()
+    names = ["buyLimit", "sellLimit", "buyStop", "sellStop"]
+    api = metatrader(server)
+    for name in names:
+        getattr(api, name)("EURUSD", 0.01, 0, 0, 1.1)
+    sync = [order["type"] for order in server.open_orders.values()]
+    server.open_orders.clear()
+
+    async def pending(api):
+        for name in names:
+            await getattr(api, name)("EURUSD", 0.01, 0, 0, 1.1)
+
+    run(server, pending)
+    assert [order["type"] for order in server.open_orders.values()] == sync
+    assert sync == [
+        "ORDER_TYPE_BUY_LIMIT",
+        "ORDER_TYPE_SELL_LIMIT",
+        "ORDER_TYPE_BUY_STOP",
+        "ORDER_TYPE_SELL_STOP",
+    ]
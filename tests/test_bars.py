@@ -0,0 +1,65 @@
+import pytest
+
+from ejtraderMT.api.bars import BarBuilder
+from ejtraderMT.api.stream import Tick, Trade
+
+
+def tick(second, bid, spread=0.0001):
+    return Tick("EURUSD", second * 1000, bid, bid + spread)
+
+
+def test_candle_closes_with_the_first_tick_of_the_next_one():
+    builder = BarBuilder(["M1"])
+    closed = []
+    builder.on_close(lambda symbol, chartTF, bar: closed.append((chartTF, bar)))
+    for second, bid in ((0, 1.0), (10, 1.5), (20, 0.5), (59, 1.2)):
+        builder.update(tick(second, bid))
+    assert closed == []
+    builder.update(tick(60, 1.3))
+    chartTF, bar = closed[0]
+    assert chartTF == "M1"
+    assert (bar.time, bar.open, bar.high, bar.low, bar.close) == (0, 1.0, 1.5, 0.5, 1.2)
+    assert bar.volume == 4
+    assert builder.forming("EURUSD", "M1").open == 1.3
+
+
+def test_several_timeframes_at_once():
+    builder = BarBuilder(["M1", "M5"])
+    for second in range(0, 601, 30):
+        builder.update(tick(second, 1.0))
+    assert len(builder.closed("EURUSD", "M1")) == 10
+    assert len(builder.closed("EURUSD", "M5")) == 2
+    assert len(builder.frame("EURUSD", "M5")) == 3
+
+
+def test_late_tick_of_a_closed_candle_is_ignored():
+    builder = BarBuilder(["M1"])
+    builder.update(tick(70, 1.0))
+    builder.update(tick(30, 5.0))
+    assert builder.closed("EURUSD", "M1") == []
+    assert builder.forming("EURUSD", "M1").high == 1.0
+
+
+def test_spread_in_points_and_trade_volume():
+    builder = BarBuilder(["M1"], point=0.00001)
+    builder.update(Trade("EURUSD", 0, 0, 1.0, 1.0002, 1.0001, 3))
+    builder.update(Trade("EURUSD", 1000, 0, 1.0, 1.0001, 1.0003, 2))
+    bar = builder.forming("EURUSD", "M1")
+    assert bar.close == 1.0003
+    assert bar.volume == 5
+    assert bar.spread == 10
+
+
+def test_failing_callback_does_not_stop_the_others():
+    builder = BarBuilder(["M1"])
+    closed = []
+    builder.on_close(lambda *args: 1 / 0)
+    builder.on_close(lambda *args: closed.append(args))
+    builder.update(tick(0, 1.0))
+    builder.update(tick(60, 1.0))
+    assert len(closed) == 1
+
+
+def test_unknown_timeframe():
+    with pytest.raises(KeyError):
+        BarBuilder(["M7"])
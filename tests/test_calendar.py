@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture
+def api(mock_server, metatrader, tmp_path, monkeypatch):
+    # the calendar is cached under DataBase/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    server = mock_server()
+    return server, metatrader(server)
+
+
+def test_calendar_asks_each_missing_range_once(api):
+    server, api = api
+    events = api.calendar(None, "04/01/2021", "13/01/2021")
+    assert server.served["CALENDAR"] == 1
+    assert len(events) == 30
+
+    assert len(api.calendar(None, "04/01/2021", "13/01/2021")) == 30
+    assert server.served["CALENDAR"] == 1
+
+    # one range before and one after the cached days
+    assert len(api.calendar(None, "01/01/2021", "20/01/2021")) == 60
+    assert server.served["CALENDAR"] == 3
+
+
+def test_calendar_requests_span_a_month_at_most(api):
+    server, api = api
+    events = api.calendar(None, "01/01/2021", "11/03/2021")
+    assert server.served["CALENDAR"] == 3
+    assert len(events) == 70 * 3
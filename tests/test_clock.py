@@ -0,0 +1,59 @@
+import time
+
+import pytest
+import zmq
+
+from ejtraderMT.api.clock import BrokerClock
+
+HOUR = 3600
+
+
+def account(timestamp):
+    """ACCOUNT reply stamped with a broker time"""
+    return {"time": time.strftime("%Y.%m.%d %H:%M:%S", time.gmtime(timestamp))}
+
+
+def test_clock_keeps_the_sample_with_the_shortest_round_trip():
+    clock = BrokerClock()
+    now = 1_600_000_000
+    # broker two hours ahead, stamped halfway through each round trip
+    clock.sample(account(now + 2 * HOUR + 5), now, now + 10)
+    clock.sample(account(now + 2 * HOUR + 1), now, now + 2)
+    clock.commit()
+    assert clock.rtt == 2
+    assert clock.utc_offset == 2 * HOUR
+
+
+def test_clock_keeps_the_last_offset_when_the_terminal_is_down():
+    replies = [account(time.time() + HOUR)]
+
+    def command():
+        if not replies:
+            raise zmq.NotDone("Data socket timeout ERROR")
+        return replies.pop()
+
+    clock = BrokerClock(command, samples=1, refresh=0)
+    assert clock.utc_offset == HOUR
+    # expired, the failed measure keeps the offset in use
+    assert clock.utc_offset == HOUR
+
+
+def test_clock_without_an_offset_raises():
+    def command():
+        raise zmq.NotDone("Data socket timeout ERROR")
+
+    with pytest.raises(zmq.NotDone):
+        BrokerClock(command).now()
+
+
+def test_metatrader_reads_broker_time_locally(mock_server, metatrader):
+    server = mock_server()
+    api = metatrader(server)
+    api.clock.ensure()
+    served = server.served["ACCOUNT"]
+    for _ in range(10):
+        api.clock.now()
+    assert server.served["ACCOUNT"] == served
+    # the mock stamps its replies in UTC
+    assert api.clock.utc_offset == 0
+    assert abs(api.clock.timestamp() - time.time()) < 2
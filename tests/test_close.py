@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pandas as pd
+from tqdm import tqdm
+
+from ejtraderMT import Metatrader
+from ejtraderMT.api.mql import Functions
+from ejtraderMT.api.pool import SocketPool
+
+
+def test_close_stops_every_thread(mock_server, tmp_path, monkeypatch):
+    # tqdm's own monitor thread outlives every progress bar
+    monkeypatch.setattr(tqdm, "monitor_interval", 0)
+    server = mock_server(stream_interval=0.01)
+    before = threading.active_count()
+    api = Metatrader(f"127.0.0.1:{server.SYS_PORT}", processes=1)
+    api.stream("EURUSD", "TICK")
+    api.stream(["EURUSD", "GBPUSD"], "M1", callback=lambda record: None)
+    api.record("EURUSD", path=str(tmp_path))
+    api.mirror()
+    api.history("EURUSD", "H1", "04/01/2021", "05/01/2021")
+    assert threading.active_count() > before
+
+    api.close()
+    deadline = time.time() + 5
+    while threading.active_count() > before and time.time() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() == before
+
+
+def test_history_decoded_on_processes_matches_threads(mock_server, metatrader):
+    server = mock_server()
+    threads = metatrader(server).history("EURUSD", "M1", "04/01/2021", "08/01/2021")
+    processes = metatrader(server, processes=2).history(
+        "EURUSD", "M1", "04/01/2021", "08/01/2021"
+    )
+    assert len(threads) == 5 * 1440
+    pd.testing.assert_frame_equal(threads, processes)
+
+
+def test_closed_pool_closes_its_sockets(mock_server):
+    server = mock_server()
+    pool = SocketPool(lambda: Functions("127.0.0.1", port=server.SYS_PORT), size=2)
+    idle = pool.acquire()
+    busy = pool.acquire()
+    pool.release(idle)
+    pool.close()
+    assert idle.sys_socket.closed and not busy.sys_socket.closed
+    pool.release(busy)
+    assert busy.sys_socket.closed
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ejtraderMT.api.decoder import HistoryDecoder, align
+
+
+def bars(times, close=1.0):
+    # [time, open, high, low, close, tick_volume, real_volume, spread]
+    return [[t, close, close + 1, close - 1, close, 10, 20, 2] for t in times]
+
+
+def test_decoder_sorts_and_dedupes_across_replies():
+    decoder = HistoryDecoder("M1")
+    decoder.append(bars([120, 180]))
+    decoder.append(bars([60, 120], close=2.0))
+    time, values = decoder.arrays()
+    assert time.tolist() == [60, 120, 180]
+    # the first reply wins on duplicated timestamps
+    assert values[3].tolist() == [2.0, 1.0, 1.0]
+    assert len(decoder) == 4
+
+
+def test_decoder_volume_column_follows_real_volume():
+    decoder = HistoryDecoder("M1")
+    real = HistoryDecoder("M1", real_volume=True)
+    for d in (decoder, real):
+        d.append(bars([60]))
+    assert decoder.frame()["volume"].iloc[0] == 10
+    assert real.frame()["volume"].iloc[0] == 20
+
+
+def test_decoder_grows_past_capacity():
+    decoder = HistoryDecoder("M1", capacity=2)
+    decoder.append(bars(range(0, 6000, 60)))
+    assert len(decoder.frame()) == 100
+
+
+def test_decoder_ticks_use_ms():
+    decoder = HistoryDecoder("TICK")
+    decoder.append([[1500, 1.1, 1.2], [500, 1.0, 1.1]])
+    df = decoder.frame()
+    assert list(df.columns) == ["bid", "ask"]
+    assert df.index[0].value == 500 * 10**6
+
+
+def test_decoder_rejects_flat_rows():
+    with pytest.raises(ValueError):
+        HistoryDecoder("M1").append([1, 2, 3])
+
+
+def decoders():
+    main = HistoryDecoder("M1")
+    main.append(bars([60, 120, 180]))
+    other = HistoryDecoder("M1")
+    other.append(bars([120, 240], close=5.0))
+    return [main, other]
+
+
+def test_align_inner_keeps_common_times():
+    df = align(decoders(), [None, "gbpusd"], how="inner")
+    assert df.index.tolist() == [pd.Timestamp(120, unit="s")]
+    assert df["gbpusd_close"].iloc[0] == 5.0
+
+
+def test_align_outer_fills_missing_with_nan():
+    df = align(decoders(), [None, "gbpusd"], how="outer")
+    assert len(df) == 4
+    assert np.isnan(df["gbpusd_close"].iloc[0])
+    assert np.isnan(df["close"].iloc[-1])
+
+
+def test_align_asof_takes_last_known_row():
+    df = align(decoders(), [None, "gbpusd"], how="asof")
+    assert len(df) == 3
+    assert np.isnan(df["gbpusd_close"].iloc[0])
+    assert df["gbpusd_close"].iloc[2] == 5.0
+
+
+def test_align_rejects_unknown_join():
+    with pytest.raises(ValueError):
+        align(decoders(), [None, "gbpusd"], how="left")
+
+
+def test_decoder_time_and_sales():
+    decoder = HistoryDecoder("TS")
+    decoder.append([[2000, 1, 1.1, 1.2, 1.15, 3.0], [1000, 0, 1.0, 1.1, 1.05, 2.0]])
+    df = decoder.frame()
+    assert list(df.columns) == ["type", "bid", "ask", "last", "volume"]
+    assert df.index[0].value == 1000 * 10**6
+    assert df["type"].tolist() == [0, 1]
+    assert df["last"].tolist() == [1.05, 1.15]
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+from ejtraderMT.api.history import (
+    AdaptiveChunker,
+    HistoryEngine,
+    IncompleteHistory,
+    merge_ranges,
+    missing_ranges,
+)
+from ejtraderMT.api.mql import Functions
+from ejtraderMT.api.pool import SocketPool
+from ejtraderMT.api.retry import RetryPolicy
+
+DAY = 86400
+
+
+def engine(server, timeout=1000, size=3):
+    pool = SocketPool(
+        lambda: Functions(
+            "127.0.0.1",
+            port=server.SYS_PORT,
+            timeout=timeout,
+            retry=RetryPolicy(attempts=1),
+        ),
+        size=size,
+    )
+    return HistoryEngine(pool)
+
+
+def requests(days):
+    return [
+        dict(
+            action="HISTORY",
+            actionType="DATA",
+            symbol="EURUSD",
+            chartTF="H1",
+            fromDate=day * DAY,
+            toDate=(day + 1) * DAY,
+        )
+        for day in range(days)
+    ]
+
+
+def test_fetch_keeps_the_request_order(mock_server):
+    server = mock_server()
+    replies = engine(server).fetch(requests(6))
+    assert [reply["data"][0][0] for reply in replies] == [day * DAY for day in range(6)]
+    assert server.served["HISTORY"] == 6
+
+
+def test_fetch_raises_with_what_came_back(mock_server):
+    server = mock_server()
+    history = server.handlers["HISTORY"]
+
+    def stall_day_two(request):
+        if request["fromDate"] == 2 * DAY:
+            time.sleep(0.3)
+        return history(request)
+
+    server.handlers["HISTORY"] = stall_day_two
+    with pytest.raises(IncompleteHistory) as error:
+        # one connection, the backlog pause lets the stalled reply drain first
+        engine(server, timeout=200, size=1).fetch(requests(4))
+    assert [request["fromDate"] for request in error.value.failed] == [2 * DAY]
+    assert [reply is None for reply in error.value.replies] == [
+        False,
+        False,
+        True,
+        False,
+    ]
+
+
+def test_merge_and_missing_ranges():
+    covered = merge_ranges([[10, 20], [0, 10], [30, 40]])
+    assert covered == [[0, 20], [30, 40]]
+    assert missing_ranges([(0, 10), (15, 25), (30, 35)], covered) == [(15, 25)]
+
+
+def windows(chunker):
+    return list(iter(chunker.next, None))
+
+
+def test_chunker_covers_the_range_without_gaps():
+    chunker = AdaptiveChunker(0, 86400 * 10, "M1", rows=1000, first=1000)
+    parts = windows(chunker)
+    assert parts[0] == (0, 60000)
+    assert parts[-1][1] == 86400 * 10
+    assert all(a[1] == b[0] for a, b in zip(parts, parts[1:]))
+
+
+def test_chunker_starts_small():
+    chunker = AdaptiveChunker(0, 86400 * 100, "M1", rows=50000)
+    begin, end = chunker.next()
+    assert end - begin == 5000 * 60
+
+
+def test_chunker_grows_at_most_4x_towards_rows():
+    chunker = AdaptiveChunker(0, 86400 * 1000, "M1", rows=50000, first=1000)
+    window = chunker.next()
+    # a full reply in no time
+    chunker.observe(window, 1000, 0.01)
+    begin, end = chunker.next()
+    assert end - begin == 4 * 1000 * 60
+
+
+def test_chunker_shrinks_on_slow_replies():
+    chunker = AdaptiveChunker(0, 86400 * 1000, "M1", rows=1000, latency=1.0)
+    window = chunker.next()
+    chunker.observe(window, 1000, 2.0)
+    begin, end = chunker.next()
+    assert end - begin == (window[1] - window[0]) / 2
+
+
+def test_chunker_skips_empty_windows_faster():
+    chunker = AdaptiveChunker(0, 86400 * 1000, "M1", rows=1000)
+    window = chunker.next()
+    chunker.observe(window, 0, 0.01)
+    begin, end = chunker.next()
+    assert end - begin == 2 * (window[1] - window[0])
+
+
+def test_chunker_ticks_follow_tick_rate():
+    chunker = AdaptiveChunker(0, 86400, "TICK", rows=1000, tick_rate=2.0)
+    begin, end = chunker.next()
+    assert end - begin == 500
@@ -0,0 +1,99 @@
+import pytest
+import zmq
+
+from ejtraderMT.api.mql import Functions
+from ejtraderMT.api.pool import Pool, TerminalPool, parse_endpoints
+from ejtraderMT.api.retry import RetryPolicy
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "XAUUSD", "US500"]
+
+
+def connect(host, port):
+    return Functions(host, port=port, timeout=200, retry=RetryPolicy(attempts=1))
+
+
+@pytest.fixture
+def terminals(mock_server):
+    servers = [mock_server(), mock_server()]
+    pool = TerminalPool(
+        [f"127.0.0.1:{server.SYS_PORT}" for server in servers], connect, size=2
+    )
+    yield servers, pool
+    pool.close()
+
+
+def test_parse_endpoints():
+    assert parse_endpoints(None) == [("localhost", 15557)]
+    assert parse_endpoints("10.0.0.2") == [("10.0.0.2", 15557)]
+    assert parse_endpoints(["a:25557", ("b", "35557")]) == [
+        ("a", 25557),
+        ("b", 35557),
+    ]
+
+
+def test_symbols_are_pinned_and_spread(terminals):
+    servers, pool = terminals
+    assigned = {symbol: pool.assign(symbol) for symbol in SYMBOLS}
+    assert {symbol: pool.assign(symbol) for symbol in SYMBOLS} == assigned
+    assert len(set(assigned.values())) == 2
+
+
+def test_commands_go_to_the_assigned_terminal(terminals):
+    servers, pool = terminals
+    for symbol in SYMBOLS:
+        pool.command(symbol, action="CONFIG", symbol=symbol, chartTF="M1")
+    for server, terminal in zip(servers, pool.terminals):
+        mine = {s for s in SYMBOLS if pool.assign(s) is terminal}
+        assert {symbol for symbol, _ in server.subscriptions} == mine
+
+
+def test_connections_go_to_the_least_busy_terminal(terminals):
+    servers, pool = terminals
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first.terminal is not second.terminal
+    pool.release(first)
+    pool.release(second)
+
+
+def test_symbols_move_when_their_terminal_goes_down(terminals):
+    servers, pool = terminals
+    down, up = pool.terminals
+    moved = []
+    pool.watch(lambda terminal, keys: moved.append((terminal, keys)))
+    symbol = next(s for s in SYMBOLS if pool.assign(s) is down)
+    servers[0].stop()
+    reply = pool.command(symbol, action="CONFIG", symbol=symbol, chartTF="M1")
+    assert not reply["error"]
+    assert not down.healthy
+    assert pool.assign(symbol) is up
+    assert moved[0][0] is down and symbol in moved[0][1]
+
+
+def test_routed_reads_fail_over(terminals):
+    servers, pool = terminals
+    servers[0].stop()
+    with pool.connection() as api:
+        # both idle, the first one is picked
+        assert api.terminal is pool.terminals[0]
+        assert api.Command(action="BALANCE")["balance"] == 10000.0
+        assert api.terminal is pool.terminals[1]
+
+
+def test_the_last_healthy_terminal_is_never_marked_down(mock_server):
+    server = mock_server()
+    pool = TerminalPool([f"127.0.0.1:{server.SYS_PORT}"], connect, size=1)
+    server.stop()
+    with pytest.raises(zmq.NotDone):
+        pool.command("EURUSD", action="BALANCE")
+    assert pool.terminals[0].healthy
+    pool.close()
+
+
+def test_pool_needs_acquire_and_release():
+    class Half(Pool):
+        def acquire(self):
+            return None
+
+    with pytest.raises(TypeError):
+        Half()
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize("dbtype", ["SQLITE", "BARSTORE"])
+def test_resample_stored_bars(mock_server, metatrader, tmp_path, monkeypatch, dbtype):
+    # SQLITE keeps the history under DataBase/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    api = metatrader(mock_server(), dbtype=dbtype, dbpath=str(tmp_path / "store"))
+    api.sync("USDCHF", "M1", "04/01/2021", "05/01/2021")
+
+    # without fromDate from the first stored bar
+    assert len(api.resample("USDCHF", "H1")) == 48
+    assert len(api.resample("USDCHF", "H1", toDate="04/01/2021")) == 24
+    assert len(api.resample("USDCHF", "H1", fromDate="05/01/2021")) == 24
+    daily = api.resample("USDCHF", ["H4", "D1"])
+    assert len(daily["H4"]) == 12 and len(daily["D1"]) == 2
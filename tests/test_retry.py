@@ -0,0 +1,107 @@
+import time
+from threading import Thread
+
+import pytest
+import zmq
+
+from ejtraderMT.api.metrics import Metrics
+from ejtraderMT.api.mql import Functions
+from ejtraderMT.api.retry import Backlog, RetryPolicy
+
+
+def stall_first(server, action, seconds):
+    """Answer action late once, then normally"""
+    handler = server.handlers[action]
+    calls = []
+
+    def stalled(request):
+        calls.append(request)
+        if len(calls) == 1:
+            time.sleep(seconds)
+        return handler(request)
+
+    server.handlers[action] = stalled
+    return calls
+
+
+def test_policy_backoff_is_capped():
+    policy = RetryPolicy(attempts=5, backoff=0.1, factor=2.0, max_backoff=0.3)
+    assert [policy.delay(n) for n in (1, 2, 3)] == [0.1, 0.2, 0.3]
+    assert policy.retryable({"action": "HISTORY"})
+    assert not policy.retryable({"action": "TRADE"})
+
+
+def test_timed_out_read_is_resent_on_a_new_socket(mock_server):
+    server = mock_server()
+    calls = stall_first(server, "BALANCE", 0.5)
+    metrics = Metrics()
+    api = Functions(
+        "127.0.0.1",
+        port=server.SYS_PORT,
+        timeout=200,
+        metrics=metrics,
+        retry=RetryPolicy(attempts=3, backoff=0.01),
+    )
+    reply = api.Command(action="BALANCE")
+    assert reply["balance"] == 10000.0
+    assert len(calls) == 2
+    assert metrics.counters[("BALANCE", None, "timeouts")] == 1
+
+
+def test_timed_out_trade_is_not_resent(mock_server):
+    server = mock_server()
+    calls = stall_first(server, "TRADE", 0.5)
+    api = Functions(
+        "127.0.0.1",
+        port=server.SYS_PORT,
+        timeout=200,
+        retry=RetryPolicy(attempts=3, backoff=0.01),
+    )
+    with pytest.raises(zmq.NotDone):
+        api.Command(
+            action="TRADE", actionType="ORDER_TYPE_BUY", symbol="EURUSD", volume=0.1
+        )
+    time.sleep(0.6)
+    # the socket was replaced, the next command gets its own reply
+    assert api.Command(action="BALANCE")["balance"] == 10000.0
+    assert len(calls) == 1
+
+
+def test_backlog_halves_after_a_timeout_and_recovers():
+    backlog = Backlog(limit=4)
+    backlog.enter()
+    backlog.leave(pause=0.05)
+    assert backlog.allowed == 2
+    started = time.monotonic()
+    assert backlog.enter() == 1
+    assert time.monotonic() - started >= 0.04
+    backlog.leave()
+    assert backlog.allowed == 3
+
+
+def test_backlog_bounds_requests_in_flight():
+    backlog = Backlog(limit=2)
+    backlog.enter()
+    backlog.enter()
+    entered = []
+    waiter = Thread(target=lambda: entered.append(backlog.enter()))
+    waiter.start()
+    time.sleep(0.05)
+    assert entered == []
+    backlog.leave()
+    waiter.join(1)
+    assert entered == [2]
+
+
+def test_metatrader_backlog_is_shared_per_terminal(mock_server, metatrader):
+    server = mock_server()
+    default = metatrader(server)
+    with default.terminals.connection() as api:
+        assert api.backlog.limit == 2
+
+    terminals = metatrader(server, workers=8, backlog=8).terminals
+    first = terminals.acquire()
+    second = terminals.acquire()
+    assert first.backlog is second.backlog and first.backlog.limit == 8
+    terminals.release(first)
+    terminals.release(second)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from ejtraderMT.api.store import BarStore
+
+
+def bars(start, periods, close=1.0):
+    index = pd.date_range(start, periods=periods, freq="h", name="date")
+    return pd.DataFrame(
+        {
+            "open": close,
+            "high": close + 1,
+            "low": close - 1,
+            "close": close,
+            "volume": np.arange(periods),
+            "spread": 2,
+        },
+        index=index,
+    )
+
+
+def test_store_partitions_bars_by_month(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write("EURUSD", "H1", bars("2021-01-31", 48))
+    assert store.partitions("EURUSD", "H1") == ["2021-01", "2021-02"]
+    assert store.symbols() == ["EURUSD"] and store.timeframes("EURUSD") == ["H1"]
+    assert len(store.read("EURUSD", "H1")) == 48
+    # a date string covers its whole day
+    february = store.read("EURUSD", "H1", "01/02/2021", "01/02/2021")
+    assert len(february) == 24 and february.index[0] == pd.Timestamp("2021-02-01")
+
+
+def test_store_upserts_rows_with_the_same_date(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write("EURUSD", "H1", bars("2021-01-04", 24))
+    store.write("EURUSD", "H1", bars("2021-01-04 12:00", 24, close=2.0))
+    df = store.read("EURUSD", "H1")
+    assert len(df) == 36
+    assert df["close"].tolist() == [1.0] * 12 + [2.0] * 24
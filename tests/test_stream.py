@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+import zmq
+
+from ejtraderMT.api.stream import Bar, PriceStream, RingBuffer, Subscriptions, Tick
+
+
+def test_ring_window_before_wrapping():
+    ring = RingBuffer(10, Tick)
+    for second in range(5):
+        ring.append(Tick("EURUSD", second * 1000, 1.0 + second, 2.0))
+    records = ring.window(2)
+    # the last 2 seconds before the newest tick, the boundary excluded
+    assert records["time"].tolist() == [3000, 4000]
+    assert records["bid"].tolist() == [4.0, 5.0]
+
+
+def test_ring_window_across_the_wrap():
+    ring = RingBuffer(4, Tick)
+    for second in range(10):
+        ring.append(Tick("EURUSD", second * 1000, 1.0, 2.0))
+    assert len(ring) == 4
+    assert ring.window(2)["time"].tolist() == [8000, 9000]
+    assert ring.window(100)["time"].tolist() == [6000, 7000, 8000, 9000]
+    assert ring.last(3)["time"].tolist() == [7000, 8000, 9000]
+
+
+def test_ring_window_empty():
+    assert len(RingBuffer(4, Tick).window(10)) == 0
+
+
+def test_ring_bar_with_same_time_replaces_the_newest():
+    ring = RingBuffer(4, Bar)
+    ring.append(Bar("EURUSD", 60, 1, 2, 0.5, 1.5, 10, 1))
+    ring.append(Bar("EURUSD", 60, 1, 3, 0.5, 2.5, 20, 1))
+    assert len(ring) == 1
+    assert ring.last()["close"].tolist() == [2.5]
+
+
+def test_conflate_keeps_the_latest_record_per_symbol():
+    stream = PriceStream("TICK", policy="conflate")
+    stream.put([Tick("EURUSD", 1, 1.0, 1.1), Tick("GBPUSD", 1, 2.0, 2.1)])
+    stream.put([Tick("EURUSD", 2, 1.5, 1.6)])
+    assert stream.dropped == 1
+    assert stream.get(timeout=0) == Tick("EURUSD", 2, 1.5, 1.6)
+    assert stream.get(timeout=0).symbol == "GBPUSD"
+    assert stream.get(timeout=0) is None
+
+
+def test_drop_keeps_the_newest_maxsize_records():
+    stream = PriceStream("TICK", maxsize=2)
+    stream.put([Tick("EURUSD", t, 1.0, 1.1) for t in range(5)])
+    assert stream.dropped == 3
+    assert [record.time for record in stream.drain()] == [3, 4]
+
+
+def test_one_symbol_is_not_split_into_characters():
+    subscriptions = Subscriptions(zmq.Context.instance().socket(zmq.PULL))
+    stream = subscriptions.add("EURUSD", PriceStream("TICK"))
+    assert {symbol for symbol, _ in subscriptions.pairs()} == {"EURUSD"}
+    stream.close()
+    subscriptions.close()
+
+
+def test_aget_that_gave_up_is_not_woken():
+    stream = PriceStream("TICK")
+    assert asyncio.run(stream.aget(timeout=0.01)) is None
+
+    async def cancelled():
+        task = asyncio.ensure_future(stream.aget())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled())
+    # both loops are closed, put must not try to wake their waiters
+    stream.put([Tick("EURUSD", 1, 1.0, 1.1)])
+    assert stream.get(timeout=0) == Tick("EURUSD", 1, 1.0, 1.1)
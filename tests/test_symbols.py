@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from ejtraderMT.api.symbols import SymbolRegistry, expiration_date
+
+
+def test_expiration_date():
+    assert expiration_date("1970.01.01 00:00") is None
+    assert expiration_date("2021.04.14 18:00") == datetime(2021, 4, 14, 18)
+    assert expiration_date(0) is None
+
+
+def test_registry_is_saved_per_server(tmp_path):
+    path = str(tmp_path / "symbols.json")
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"data": [["EURUSD", "", "FOREX"], ["WINJ21", "2021.04.14", "FUTURES"]]}
+
+    registry = SymbolRegistry(fetch, path=path, server="a:15557")
+    assert "EURUSD" in registry and len(registry) == 2
+    assert SymbolRegistry(fetch, path=path, server="a:15557").get("WINJ21")
+    assert len(calls) == 1
+    # another terminal's list is not loaded
+    SymbolRegistry(fetch, path=path, server="b:15557").ensure()
+    assert len(calls) == 2
+
+
+def test_metatrader_symbols_come_from_the_registry(
+    mock_server, metatrader, tmp_path, monkeypatch
+):
+    # the list is saved under DataBase/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    server = mock_server()
+    api = metatrader(server)
+    assert len(api.symbols()) == 7
+    assert api.symbols(type="FUTURES")["symbol"].tolist() == ["WINJ21"]
+    assert server.served["LISTSYMBOLS"] == 1
+
+    # a new client of the same terminal starts from the saved list
+    assert len(metatrader(server).symbols()) == 7
+    assert server.served["LISTSYMBOLS"] == 1
+    futures = api.registry.filter(expires_before="2021-05-01")
+    assert [info["symbol"] for info in futures] == ["WINJ21"]
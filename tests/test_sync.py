@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from ejtraderMT.api.history import IncompleteHistory
+from ejtraderMT.api.retry import RetryPolicy
+from ejtraderMT.api.store import BarStore
+
+DAY = 86400
+# 04/01/2021
+MONDAY = 1609718400
+
+
+def test_sync_fetches_only_the_missing_ranges(mock_server, metatrader, tmp_path):
+    server = mock_server()
+    api = metatrader(server, dbtype="BARSTORE", dbpath=str(tmp_path))
+    first = api.sync("EURUSD", "H1", "04/01/2021", "13/01/2021")
+    # ten days of H1 fit in the first window of one request
+    assert server.served["HISTORY"] == 1
+    assert len(first) == 240
+
+    api.sync("EURUSD", "H1", "04/01/2021", "13/01/2021")
+    assert server.served["HISTORY"] == 1
+
+    both = api.sync("EURUSD", "H1", "04/01/2021", "23/01/2021")
+    assert server.served["HISTORY"] == 2
+    assert len(both) == 480
+    assert BarStore(str(tmp_path)).ranges("EURUSD", "H1") == [
+        [MONDAY, MONDAY + 20 * DAY]
+    ]
+
+
+def test_sync_merges_consecutive_missing_days(mock_server, metatrader, tmp_path):
+    server = mock_server()
+    api = metatrader(server, dbtype="BARSTORE", dbpath=str(tmp_path))
+    api.sync("EURUSD", "H1", "08/01/2021", "09/01/2021")
+    # one gap before and one after the stored days
+    api.sync("EURUSD", "H1", "04/01/2021", "13/01/2021")
+    assert server.served["HISTORY"] == 3
+    assert BarStore(str(tmp_path)).ranges("EURUSD", "H1") == [
+        [MONDAY, MONDAY + 10 * DAY]
+    ]
+
+
+def test_sync_stores_what_came_back_before_raising(mock_server, metatrader, tmp_path):
+    server = mock_server()
+    history = server.handlers["HISTORY"]
+
+    def stall_gbpusd(request):
+        if request["symbol"] == "GBPUSD":
+            time.sleep(0.3)
+        return history(request)
+
+    server.handlers["HISTORY"] = stall_gbpusd
+    api = metatrader(
+        server,
+        dbtype="BARSTORE",
+        dbpath=str(tmp_path),
+        timeout=200,
+        retry=RetryPolicy(attempts=1),
+        # one connection, EURUSD is asked first and answered before the stall
+        workers=1,
+    )
+    with pytest.raises(IncompleteHistory) as error:
+        api.sync(["EURUSD", "GBPUSD"], "H1", "04/01/2021", "13/01/2021")
+    assert [request["symbol"] for request in error.value.failed] == ["GBPUSD"]
+    store = BarStore(str(tmp_path))
+    assert store.ranges("EURUSD", "H1") == [[MONDAY, MONDAY + 10 * DAY]]
+    assert store.ranges("GBPUSD", "H1") == []
@@ -0,0 +1,34 @@
+import time
+
+import numpy as np
+
+from ejtraderMT.api.ticks import TickArchive
+
+
+def test_archive_skips_ticks_it_already_has(tmp_path):
+    archive = TickArchive(str(tmp_path / "EURUSD.ticks"))
+    assert archive.append([1000, 2000], [1.0, 1.1], [1.2, 1.3]) == 2
+    assert archive.append([2000, 3000], [1.1, 1.2], [1.3, 1.4]) == 1
+    reopened = TickArchive(archive.filename)
+    assert reopened.last == 3000
+    assert reopened.records()["time"].tolist() == [1000, 2000, 3000]
+
+
+def test_recording_does_not_stop_the_backfill(mock_server, metatrader, tmp_path):
+    server = mock_server(stream_interval=0.01)
+    api = metatrader(server)
+    recorder = api.record("EURUSD", path=str(tmp_path))
+    deadline = time.time() + 5
+    while not recorder.written and time.time() < deadline:
+        time.sleep(0.05)
+    recorder.close()
+    assert recorder.written
+    assert len(api.ticks("EURUSD", path=str(tmp_path), live=True)) == recorder.written
+
+    archive = api.archive("EURUSD", "04/01/2021", "06/01/2021", path=str(tmp_path))
+    time_ = archive.records()["time"]
+    assert len(time_)
+    # the adaptive windows join without gaps, the mock ticks every second
+    assert np.all(np.diff(time_) > 0) and np.diff(time_).max() <= 2000
+    # the whole range was fetched even though newer live ticks were recorded
+    assert time_[0] < 1609804800000 and time_[-1] < 1609977600000
@@ -0,0 +1,60 @@
+import pytest
+
+from ejtraderMT.api.decoder import HistoryDecoder
+from ejtraderMT.api.wire import (
+    BARS,
+    DTYPES,
+    TICKS,
+    TS,
+    count_rows,
+    decode_reply,
+    encode_reply,
+    pack,
+    unpack,
+)
+
+ROWS = {
+    BARS: [
+        [60, 1.0, 1.2, 0.9, 1.1, 10, 10000, 2],
+        [120, 1.1, 1.3, 1.0, 1.2, 20, 20000, 3],
+    ],
+    TICKS: [[1000, 1.1, 1.2], [2000, 1.2, 1.3]],
+    TS: [[1000, 0, 1.1, 1.2, 1.15, 1.0], [2000, 1, 1.2, 1.3, 1.25, 2.0]],
+}
+
+
+@pytest.mark.parametrize("kind", [BARS, TICKS, TS])
+def test_pack_unpack_round_trip(kind):
+    records = unpack(pack(kind, ROWS[kind]))
+    assert records.dtype == DTYPES[kind]
+    assert [list(row) for row in records.tolist()] == ROWS[kind]
+    # packing the structured array again gives the same bytes
+    assert pack(kind, records) == pack(kind, ROWS[kind])
+
+
+def test_unpack_rejects_other_payloads():
+    payload = pack(TICKS, ROWS[TICKS])
+    with pytest.raises(ValueError):
+        unpack(b"XXXX" + payload[4:])
+
+
+@pytest.mark.parametrize("chartTF, kind", [("M1", BARS), ("TICK", TICKS), ("TS", TS)])
+def test_binary_and_json_replies_decode_alike(chartTF, kind):
+    binary = encode_reply({"error": False}, kind, ROWS[kind])
+    text = encode_reply({"error": False, "data": ROWS[kind]})
+    assert count_rows(binary) == count_rows(text) == 2
+    frames = []
+    for reply in (binary, text):
+        decoder = HistoryDecoder(chartTF)
+        decoder.append(decode_reply(reply)["data"])
+        frames.append(decoder.frame())
+    assert frames[0].equals(frames[1])
+
+
+def test_binary_time_and_sales_history(mock_server, metatrader):
+    api = metatrader(mock_server(tick_interval=60000), encoding="binary")
+    df = api.history("EURUSD", "TS", "04/01/2021", "04/01/2021")
+    assert list(df.columns) == ["type", "bid", "ask", "last", "volume"]
+    # a tick a minute, each window of the mock starts its own grid
+    assert len(df) >= 1440 and df.index.is_monotonic_increasing
+    assert set(df["type"]) <= {0, 1}